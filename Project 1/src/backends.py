@@ -0,0 +1,92 @@
+import os
+from contextlib import nullcontext
+import numpy as np
+from f_shading import f_shading
+from g_shading import g_shading
+from batch_shading import batch_shading
+from tiled_shading import tiled_shading
+
+"""
+The rasterization backends of render_img.
+
+A backend is a function that colors a set of triangles into an image. All the backends have the same arguments
+and the same result, so render_img (and everything built on it) works the same way with any of them:
+
+backend(img, zbuf, vertices, vcolors, depths, shading, stats=None, workers=None)
+
+img is the M × N × 3 image and zbuf its M × N depth buffer, both updated in place,
+vertices is a K × 3 × 2 array with the 2D coordinates of the vertices of K triangles, vcolors is a K × 3 × 3 array
+with their colors and depths is a K × 3 array with their depths, shading is "f" or "g",
+stats is an optional RenderStats object (see render_stats.py) and workers is the number of processes of the
+backends that use more than one. The backend returns the image.
+A backend that supports the painter's algorithm is also called with zbuf = None, when render_img is called without
+a depth buffer (zbuffer=False). The other backends always get a depth buffer.
+
+The backends are registered by name in BACKENDS:
+"reference": f_shading or g_shading, one call per triangle (the original implementation, kept for validation).
+             It is the only backend that supports the painter's algorithm.
+"numpy": batch_shading, which rasterizes many triangles per NumPy call.
+"tiled": tiled_shading, which colors tiles of the image in parallel, in worker processes.
+
+The function register_backend adds a backend (e.g. a faster implementation for a specific machine).
+painter is True if the backend supports zbuf = None.
+The function get_backend returns the name of a backend and its entry in BACKENDS (function, painter).
+If name is None, the backend is given by the environment variable RENDER_BACKEND, and by default it is "reference".
+So the backend of a deployment can be chosen without changing the code, e.g. RENDER_BACKEND=numpy python demo.py.
+An unknown backend name raises a ValueError.
+"""
+
+# The environment variable that selects the default backend
+BACKEND_VARIABLE = "RENDER_BACKEND"
+DEFAULT_BACKEND = "reference"
+
+# The registered backends: name -> (function, painter)
+BACKENDS = {}
+
+
+def register_backend(name, function, painter=False):
+    BACKENDS[name] = (function, painter)
+
+
+def get_backend(name=None):
+    if name is None:
+        name = os.environ.get(BACKEND_VARIABLE) or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError('Unknown rendering backend "{}" (the backends are: {})'.format(name, ", ".join(BACKENDS)))
+    return name, BACKENDS[name]
+
+
+def reference_shading(img, zbuf, vertices, vcolors, depths, shading, stats=None, workers=None):
+    shade = f_shading if shading == "f" else g_shading
+
+    if zbuf is not None:
+        # With a depth buffer, the triangles can be drawn in any order.
+        for k in range(len(vertices)):
+            shade(img, vertices[k], vcolors[k], depths[k], zbuf, stats)
+        return img
+
+    # The painter's algorithm
+    with stats.stage("sort") if stats is not None else nullcontext():
+        # The depth of a triangle is calculated as the centroid of the depths of its vertices.
+        t_depths = (depths[:, 0] + depths[:, 1] + depths[:, 2]) / 3
+
+        # I sort the indices of the triangles once, in descending order of depth (from largest to smallest).
+        # The sorting is stable, so triangles with equal depths keep their original order.
+        order = np.argsort(-t_depths, kind="stable")
+
+    for k in order:
+        shade(img, vertices[k], vcolors[k], stats=stats)
+    return img
+
+
+def numpy_shading(img, zbuf, vertices, vcolors, depths, shading, stats=None, workers=None):
+    return batch_shading(img, zbuf, vertices, vcolors, depths, shading, stats)
+
+
+def tiled_backend(img, zbuf, vertices, vcolors, depths, shading, stats=None, workers=None):
+    return tiled_shading(img, zbuf, vertices, vcolors, depths, shading, workers=workers, stats=stats)
+
+
+register_backend("reference", reference_shading, painter=True)
+register_backend("numpy", numpy_shading)
+register_backend("tiled", tiled_backend)
@@ -0,0 +1,159 @@
+import math
+import numpy as np
+
+"""
+triangle_bbox function:
+
+The triangle_bbox function returns the bounding box of the pixels that a triangle may cover, clipped to the image,
+as a tuple (area, x_min, x_max, y_min, y_max), where area is twice the signed area of the triangle.
+vertices is the 3 × 2 array of the triangle and M, N are the height and width of the image.
+Pixels are at integer coordinates, so the box goes from the ceiling of the smallest to the floor of the largest
+coordinate of the vertices: a triangle smaller than a pixel gets a box with at most one pixel (or none at all).
+The function returns None when the triangle cannot cover any pixel: when its area is zero, when it lies outside
+the image or when it falls between the pixels. It works with plain Python numbers, as it is called once per triangle.
+"""
+
+
+def triangle_bbox(vertices, M, N):
+    (x1, y1), (x2, y2), (x3, y3) = np.asarray(vertices, dtype=np.float64).tolist()
+
+    # Twice the signed area of the triangle. Its sign is the orientation (winding) of the vertices.
+    area = (x2 - x1) * (y3 - y1) - (x3 - x1) * (y2 - y1)
+    if area == 0:
+        return None
+
+    # The bounding box of the pixels of the triangle, clipped to the image.
+    x_min = max(math.ceil(min(x1, x2, x3)), 0)
+    x_max = min(math.floor(max(x1, x2, x3)), M - 1)
+    y_min = max(math.ceil(min(y1, y2, y3)), 0)
+    y_max = min(math.floor(max(y1, y2, y3)), N - 1)
+    if x_min > x_max or y_min > y_max:
+        return None
+    return area, x_min, x_max, y_min, y_max
+
+
+"""
+pixel_boxes function:
+
+The pixel_boxes function is the vectorized version of triangle_bbox for many triangles: vertices is a K × 3 × 2 array
+with the vertices of K triangles and M, N are the height and width of the image.
+It returns the arrays (x_min, x_max, y_min, y_max) of the bounding boxes of the pixels of the triangles, clipped to
+the image (as integers). A triangle that cannot cover any pixel of the image has x_min > x_max or y_min > y_max.
+Unlike triangle_bbox, it does not compute the areas.
+"""
+
+
+def pixel_boxes(vertices, M, N):
+    x_min = np.maximum(np.ceil(vertices[:, :, 0].min(axis=1)), 0).astype(np.intp)
+    x_max = np.minimum(np.floor(vertices[:, :, 0].max(axis=1)), M - 1).astype(np.intp)
+    y_min = np.maximum(np.ceil(vertices[:, :, 1].min(axis=1)), 0).astype(np.intp)
+    y_max = np.minimum(np.floor(vertices[:, :, 1].max(axis=1)), N - 1).astype(np.intp)
+    return x_min, x_max, y_min, y_max
+
+
+"""
+triangle_blocks function:
+
+The triangle_blocks function rasterizes a triangle with edge functions over its bounding box.
+vertices is the 3 × 2 array of the triangle and M, N are the height and width of the image.
+The bounding box of the triangle (see triangle_bbox) is split into blocks of at most block_rows rows,
+so that the memory used for a very large triangle stays bounded.
+For each block the function yields (rows, cols, mask, weights):
+rows and cols are the slices of the image covered by the block,
+mask is a boolean array with the shape of the block that is True for the pixels inside the triangle and
+weights is an array with the barycentric coordinates of every pixel of the block (its last dimension has size 3).
+If the bounding box is already known, it can be given as bbox, so that it is not computed twice.
+
+A pixel is inside the triangle when all three edge functions are positive at the pixel.
+Pixels lying exactly on an edge follow the top-left fill rule: they belong to the triangle only if the edge is a
+top or a left edge. This way, a pixel on the common edge of two neighbouring triangles is colored exactly once.
+A triangle with zero area covers no pixels.
+"""
+
+
+def triangle_blocks(vertices, M, N, block_rows=64, bbox=None):
+    if bbox is None:
+        bbox = triangle_bbox(vertices, M, N)
+        if bbox is None:
+            return
+    area, x_min, x_max, y_min, y_max = bbox
+    vertices = np.asarray(vertices, dtype=np.float64)
+    x1, y1 = vertices[0]
+    x2, y2 = vertices[1]
+    x3, y3 = vertices[2]
+    sign = 1 if area > 0 else -1
+    top_left = _top_left(vertices.tolist(), sign)
+
+    y = np.arange(y_min, y_max + 1, dtype=np.float64)[None, :]
+    for x_start in range(x_min, x_max + 1, block_rows):
+        x_end = min(x_start + block_rows - 1, x_max)
+        x = np.arange(x_start, x_end + 1, dtype=np.float64)[:, None]
+
+        # The edge functions (twice the signed areas of the sub-triangles), positive inside the triangle.
+        w1 = ((x2 - x) * (y3 - y) - (x3 - x) * (y2 - y)) * sign
+        w2 = ((x3 - x) * (y1 - y) - (x1 - x) * (y3 - y)) * sign
+        w3 = ((x1 - x) * (y2 - y) - (x2 - x) * (y1 - y)) * sign
+
+        mask = np.ones(w1.shape, dtype=bool)
+        for w, is_top_left in zip((w1, w2, w3), top_left):
+            mask &= (w >= 0) if is_top_left else (w > 0)
+
+        weights = np.stack((w1, w2, w3), axis=-1) / abs(area)
+        yield slice(x_start, x_end + 1), slice(y_min, y_max + 1), mask, weights
+
+
+"""
+pixel_weights function:
+
+The pixel_weights function is the fast path of triangle_blocks for a triangle whose bounding box is a single pixel
+(x, y), which is common for the small triangles of dense meshes.
+It evaluates the same edge functions and top-left fill rule with plain Python numbers, without creating any arrays.
+bbox is the result of triangle_bbox for the triangle.
+It returns the barycentric coordinates (l1, l2, l3) of the pixel, or None if the pixel is not inside the triangle.
+"""
+
+
+def pixel_weights(vertices, bbox):
+    area, x, _, y, _ = bbox
+    (x1, y1), (x2, y2), (x3, y3) = vertices = np.asarray(vertices, dtype=np.float64).tolist()
+    sign = 1 if area > 0 else -1
+
+    w1 = ((x2 - x) * (y3 - y) - (x3 - x) * (y2 - y)) * sign
+    w2 = ((x3 - x) * (y1 - y) - (x1 - x) * (y3 - y)) * sign
+    w3 = ((x1 - x) * (y2 - y) - (x2 - x) * (y1 - y)) * sign
+    for w, is_top_left in zip((w1, w2, w3), _top_left(vertices, sign)):
+        if w < 0 or (w == 0 and not is_top_left):
+            return None
+    return w1 / abs(area), w2 / abs(area), w3 / abs(area)
+
+
+def _top_left(vertices, sign):
+    # The edges (a -> b) opposite to each vertex, directed so that the interior of the triangle is on their left.
+    # An edge is a top or left edge if it goes downwards, or it is horizontal and goes to the left.
+    top_left = []
+    for a, b in ((vertices[1], vertices[2]), (vertices[2], vertices[0]), (vertices[0], vertices[1])):
+        d_x = (b[0] - a[0]) * sign
+        d_y = (b[1] - a[1]) * sign
+        top_left.append(d_x > 0 or (d_x == 0 and d_y < 0))
+    return top_left
+
+
+"""
+depth_test function:
+
+The depth_test function performs the depth test for the pixels of a block produced by triangle_blocks.
+zbuf is the part of the depth buffer that corresponds to the block (a view of the depth buffer of the image),
+mask and weights are the mask and the barycentric coordinates of the block and depths is the 1 × 3 vector with the
+depths of the vertices of the triangle.
+The depth of every pixel of the triangle is interpolated from the depths of the vertices. The pixels that are closer
+than the depth stored in zbuf are visible: their depth is written in zbuf and the function returns their mask.
+"""
+
+
+def depth_test(zbuf, mask, weights, depths):
+    z = weights[mask] @ np.asarray(depths, dtype=np.float64)
+    visible = z < zbuf[mask]
+    visible_mask = np.zeros_like(mask)
+    visible_mask[mask] = visible
+    zbuf[visible_mask] = z[visible]
+    return visible_mask
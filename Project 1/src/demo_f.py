@@ -1,28 +1,23 @@
-import numpy as np
-import matplotlib.pyplot as plt
-import cv2
 from render_img import render_img
+from frame_writer import FrameWriter
+from mesh_io import load_mesh
 
 # Load the input data from the file hw1.npy
-extracted_info = np.load('hw1.npy', allow_pickle=True)[()]
-# Extract lists from the dictionary
-faces = extracted_info['faces'].tolist()
-vertices = extracted_info['vertices'].tolist()
-vcolors = extracted_info['vcolors'].tolist()
-depth = extracted_info['depth'].tolist()
+# (hw1.npy is converted once to the directory hw1, whose arrays are memory-mapped)
+extracted_info = load_mesh('hw1.npy')
+# Extract the arrays from the dictionary
+faces = extracted_info['faces']
+vertices = extracted_info['vertices']
+vcolors = extracted_info['vcolors']
+depth = extracted_info['depth']
 
 print("Image filling in progress...")
 img = render_img(faces, vertices, vcolors, depth, "f")
 
 
-# Save the final image using the matplotlib library.
-
-# Display the image
-plt.imshow(img)
-plt.title('f_shading')
-plt.show()
-# Save the image
-plt.imsave('f_shading_matplotlib.png', np.array(img))
+# Save the final image (as a PNG file, without matplotlib).
+with FrameWriter('f_shading.png') as writer:
+    writer.write(img)
 
 
 # Save the final image using the OpenCV library.
@@ -32,7 +27,9 @@ I convert the img from floating-point values in the range [0, 1] to integers in
 which is the typical range for pixel values in an 8-bit per channel image. 
 Then, I convert the data type of the array to uint8 (unsigned 8-bit integer).
 """
-#img = (np.array(img) * 255).astype(np.uint8)
+#import numpy as np
+#import cv2
+#img = (img * 255).astype(np.uint8)
 
 # Convert color space from RGB to BGR
 #img_BGR = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
@@ -0,0 +1,137 @@
+import os
+import queue
+import struct
+import threading
+import zlib
+import numpy as np
+
+"""
+The class FrameWriter is a headless output stage for the rendered images (frames).
+It writes the frames to disk in a background thread, so the rendering of the next frame and the encoding of the
+previous ones overlap, without matplotlib or a GUI.
+
+path is the path of the output files and its extension selects the format:
+".png" writes a PNG image for every frame, ".npy" writes a NumPy file for every frame and
+".rgb" writes a single raw stream with the RGB bytes (uint8) of all the frames, one after the other.
+For the PNG and NumPy formats, path is formatted with the number of the frame, e.g. "frames/{:04d}.png".
+max_queue is the maximum number of frames that wait to be written. When the queue is full, write blocks until a
+frame has been written, so the memory stays bounded for long sequences.
+
+The write function adds a frame (an M × N × 3 array with values from 0 to 1, or uint8 values) to the queue.
+The close function waits until all the frames are written and stops the thread (the class can also be used in a
+with statement). An error of the background thread is raised again by the next call of write or close.
+"""
+
+
+class FrameWriter:
+    def __init__(self, path, max_queue=8):
+        self.path = path
+        self.format = os.path.splitext(path)[1].lower()
+        if self.format not in (".png", ".npy", ".rgb"):
+            raise ValueError('The extension of path must be ".png", ".npy" or ".rgb"')
+        self.count = 0  # The number of frames given to write
+        self._error = None
+        self._stream = open(path, "wb") if self.format == ".rgb" else None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self, frame):
+        self._raise_error()
+        self._queue.put((self.count, np.asarray(frame)))
+        self.count += 1
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)  # Signal the thread to stop after the frames in the queue
+            self._thread.join()
+        if self._stream is not None:
+            self._stream.close()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self._error is not None:
+                continue  # After an error, the remaining frames are dropped
+            number, frame = item
+            try:
+                if self.format == ".npy":
+                    np.save(self.path.format(number), frame)
+                elif self.format == ".png":
+                    with open(self.path.format(number), "wb") as f:
+                        f.write(encode_png(to_uint8(frame)))
+                else:
+                    self._stream.write(np.ascontiguousarray(to_uint8(frame)).tobytes())
+            except Exception as error:
+                self._error = error
+
+
+"""
+The function to_uint8 converts a frame with color values from 0 to 1 to 8-bit values (0 to 255).
+Frames that are already uint8 are returned unchanged.
+"""
+
+
+def to_uint8(frame):
+    if frame.dtype == np.uint8:
+        return frame
+    return np.around(np.clip(frame, 0, 1) * 255).astype(np.uint8)
+
+
+"""
+The function encode_png encodes an M × N × 3 uint8 frame as an (8-bit RGB) PNG file and returns its bytes.
+It only uses zlib, so matplotlib or OpenCV are not needed to save the images.
+"""
+
+
+def encode_png(frame, level=6):
+    M, N = frame.shape[:2]
+    # Each row of the image starts with a byte for the filter type (0: no filter).
+    rows = np.zeros((M, 1 + 3 * N), dtype=np.uint8)
+    rows[:, 1:] = frame.reshape(M, 3 * N)
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", N, M, 8, 2, 0, 0, 0)  # width, height, bit depth 8, RGB color
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows.tobytes(), level))
+            + chunk(b"IEND", b""))
+
+
+"""
+The function decode_png is the inverse of encode_png: it decodes the bytes of a PNG file written by encode_png
+(8-bit RGB, without filters) and returns its M × N × 3 uint8 frame (e.g. to check the images that were saved).
+Other PNG files (with filters, other color types or interlacing) raise a ValueError.
+"""
+
+
+def decode_png(data):
+    if data[:8] != b"\x89PNG\r\n\x1a\n":
+        raise ValueError("Not a PNG file")
+    chunks = {}
+    offset = 8
+    while offset < len(data):
+        length, kind = struct.unpack(">I4s", data[offset:offset + 8])
+        chunks[kind] = chunks.get(kind, b"") + data[offset + 8:offset + 8 + length]
+        offset += 12 + length  # The length, the type, the data and the CRC
+    N, M, depth, color, _, _, interlace = struct.unpack(">IIBBBBB", chunks[b"IHDR"])
+    if depth != 8 or color != 2 or interlace != 0:
+        raise ValueError("Only 8-bit RGB PNG files without interlacing are supported")
+    rows = np.frombuffer(zlib.decompress(chunks[b"IDAT"]), dtype=np.uint8).reshape(M, 1 + 3 * N)
+    if rows[:, 0].any():
+        raise ValueError("Only PNG files without filters are supported")
+    return rows[:, 1:].reshape(M, N, 3).copy()
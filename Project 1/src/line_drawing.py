@@ -1,3 +1,5 @@
+import numpy as np
+
 """
 line_drawing function :
 
@@ -48,3 +50,98 @@ def line_drawing(vert1, vert2):
         else:
             f = f - 2 * dy
     return points
+
+
+"""
+line_points function:
+
+The line_points function returns the same points as line_drawing, in the same order, as an n × 2 integer array.
+Instead of stepping through the line one pixel at a time, it computes all the points at once in closed form.
+After the same rotation and swap of the end points as in line_drawing, the line goes from (x1, y1) to (x2, y2) with
+dx = x2 - x1 >= dy = |y2 - y1|. The decision variable f of bresenham's algorithm at the k-th point of the line is
+f = dx - 2 * dy * (k + 1) + 2 * dx * n, where n is the number of steps of y before this point.
+Since y steps exactly when f < 0, the number of steps is n = ceil((2 * dy * k - dx) / (2 * dx)),
+i.e. the point of the line is y1 + ystep * n, which NumPy computes for every k with integer arithmetic.
+The coordinates of vert1 and vert2 are integers (pixels).
+"""
+
+
+def line_points(vert1, vert2):
+    points, _ = line_points_batch(np.reshape(vert1, (1, 2)), np.reshape(vert2, (1, 2)))
+    return points
+
+
+"""
+line_points_batch function:
+
+The line_points_batch function draws many line segments at once.
+starts and ends are K × 2 integer arrays with the start and end points of K segments (as vert1 and vert2 of
+line_drawing). The function returns (points, segment): points is an n × 2 array with the points of all the
+segments (the points of each segment in the same order as line_drawing) and segment is an array of length n with
+the index of the segment of every point.
+"""
+
+
+def line_points_batch(starts, ends):
+    starts = np.asarray(starts, dtype=np.intp).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=np.intp).reshape(-1, 2)
+
+    # If the slope is greater than 1, I rotate the coordinate system (as in line_drawing), so that x is the
+    # coordinate that changes by one at every point.
+    slope = np.abs(ends[:, 1] - starts[:, 1]) > np.abs(ends[:, 0] - starts[:, 0])
+    x1 = np.where(slope, starts[:, 1], starts[:, 0])
+    y1 = np.where(slope, starts[:, 0], starts[:, 1])
+    x2 = np.where(slope, ends[:, 1], ends[:, 0])
+    y2 = np.where(slope, ends[:, 0], ends[:, 1])
+
+    # Every segment starts from its leftmost point.
+    swap = x1 > x2
+    x1, x2 = np.where(swap, x2, x1), np.where(swap, x1, x2)
+    y1, y2 = np.where(swap, y2, y1), np.where(swap, y1, y2)
+    dx = x2 - x1
+    dy = np.abs(y2 - y1)
+    ystep = np.where(y1 < y2, 1, -1)
+
+    # Each segment has dx + 1 points. k is the position of every point in its segment.
+    counts = dx + 1
+    segment = np.repeat(np.arange(len(counts)), counts)
+    k = np.arange(len(segment)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    # The number of steps of y before each point, ceil((2 * dy * k - dx) / (2 * dx)), as an integer division.
+    # (A segment with dx = 0 is a single point, with n = 0.)
+    dx, dy = dx[segment], dy[segment]
+    n = -((dx - 2 * dy * k) // np.maximum(2 * dx, 1))
+    x = x1[segment] + k
+    y = y1[segment] + ystep[segment] * n
+
+    # I rotate the coordinate system back.
+    steep = slope[segment]
+    points = np.stack((np.where(steep, y, x), np.where(steep, x, y)), axis=-1)
+    return points, segment
+
+
+"""
+draw_wireframe function:
+
+The draw_wireframe function draws the edges of the triangles of a mesh on the image img (an M × N × 3 array),
+for example as an overlay on top of a rendered image.
+faces is a K × 3 array with the indices of the vertices of K triangles (as in render_img) and vertices is the
+L × 2 array with the integer coordinates (row, column) of the vertices in the image.
+color is the color of the lines. Every edge shared by two triangles is drawn once, all the edges are drawn
+together with line_points_batch and the points outside the image are skipped. The function returns the image.
+"""
+
+
+def draw_wireframe(img, faces, vertices, color=(0, 0, 0)):
+    M, N = img.shape[:2]
+    faces = np.asarray(faces, dtype=np.intp).reshape(-1, 3)
+    vertices = np.asarray(vertices)
+
+    # The 3 edges of every triangle, with the smaller vertex index first, so that I can remove the duplicates.
+    edges = np.concatenate((faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]))
+    edges = np.unique(np.sort(edges, axis=1), axis=0)
+
+    points, _ = line_points_batch(vertices[edges[:, 0]], vertices[edges[:, 1]])
+    inside = (points[:, 0] >= 0) & (points[:, 0] < M) & (points[:, 1] >= 0) & (points[:, 1] < N)
+    img[points[inside, 0], points[inside, 1]] = color
+    return img
@@ -0,0 +1,63 @@
+import os
+import shutil
+import numpy as np
+
+"""
+The mesh container format:
+
+A mesh (or a whole scene, e.g. the data of hw1.npy or hw2.npy) is stored in a directory with one plain NumPy file
+(<name>.npy, without pickled objects) for each of its arrays, e.g. vertices.npy, faces.npy, vcolors.npy, depth.npy
+or v_pos.npy, v_clr.npy, t_pos_idx.npy. Numbers (like focal or res_w) are stored as 0-dimensional arrays.
+Because the files contain only typed arrays, they are opened with np.load(mmap_mode='r'):
+the data are memory-mapped (zero-copy) and they are read from the disk only when they are used.
+
+The function convert_mesh converts a file with a pickled dictionary of arrays (such as hw1.npy and hw2.npy) to a
+mesh directory. directory is the path of the new directory (by default, the path of the file without the extension).
+It returns the path of the directory.
+The arrays are written into a new temporary directory next to it, which then replaces the directory (a previous
+conversion is moved aside and deleted). So the files of a previous conversion, which other processes may still have
+memory-mapped, are never overwritten in place, a half-written directory is never seen by load_mesh and the new
+directory is newer than the file.
+
+The function load_mesh opens a mesh directory and returns a dictionary with its arrays (read-only memory-mapped
+arrays, and Python numbers for the 0-dimensional ones).
+If path is a file with a pickled dictionary, it is first converted to a mesh directory next to it
+(only once: the directory is converted again only if the file is newer than it).
+"""
+
+
+def convert_mesh(path, directory=None):
+    if directory is None:
+        directory = os.path.splitext(path)[0]
+    data = np.load(path, allow_pickle=True)[()]
+    new = "{}.{}.tmp".format(directory, os.getpid())
+    old = "{}.{}.old".format(directory, os.getpid())
+    shutil.rmtree(new, ignore_errors=True)  # Left by a conversion that was interrupted
+    os.makedirs(new)
+    try:
+        for name, value in data.items():
+            np.save(os.path.join(new, name + ".npy"), np.asarray(value), allow_pickle=False)
+        if os.path.isdir(directory):
+            os.rename(directory, old)
+        os.rename(new, directory)
+    finally:
+        shutil.rmtree(new, ignore_errors=True)
+        shutil.rmtree(old, ignore_errors=True)
+    return directory
+
+
+def load_mesh(path):
+    if os.path.isfile(path):
+        directory = os.path.splitext(path)[0]
+        if not os.path.isdir(directory) or os.path.getmtime(directory) < os.path.getmtime(path):
+            convert_mesh(path, directory)
+        path = directory
+
+    mesh = {}
+    for file_name in sorted(os.listdir(path)):
+        name, extension = os.path.splitext(file_name)
+        if extension != ".npy":
+            continue
+        array = np.load(os.path.join(path, file_name), mmap_mode="r")
+        mesh[name] = array.item() if array.ndim == 0 else array
+    return mesh
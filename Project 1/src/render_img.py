@@ -1,10 +1,13 @@
-from f_shading import f_shading
-from g_shading import g_shading
+from contextlib import nullcontext
+import numpy as np
+from backends import get_backend
 
 """
 render_img function : 
 
 img is a colored image of dimensions M × N × 3.
+It is a contiguous float32 NumPy array (the framebuffer) with color values from 0 to 1,
+into which the shading functions write directly.
 The image will contain K colored triangles projecting a 3D object onto 2 dimensions.
 
 faces is a K × 3 array containing the vertices of K triangles.
@@ -16,87 +19,92 @@ where each element is an integer referring to the coordinates of a specific vert
 
 The L × 2 array vertices contains the coordinates of the vertices of all triangles in the image.
 (It contains the coordinates of a total of L vertices).
+The first coordinate of a vertex is its row (0 to M - 1) and the second its column (0 to N - 1) in the image.
 
 The L × 3 array vcolors contains the colors of the vertices of all triangles in the image.
 depth is the L × 1 array that indicates the depth of each vertex.
-The variable shading takes the value "f" or "g" and determines the shading function (f_shading or g_shading).
-"""
+The variable shading takes the value "f" or "g" and determines the shading (flat, as in f_shading, or Gouraud, as
+in g_shading). Any other value raises a ValueError.
+res_h (M) and res_w (N) are the height and width of the image in pixels (512 × 512 by default).
+Triangles that lie partly outside the image are clipped to its bounds.
+
+zbuffer selects how the visibility of the triangles is resolved.
+If it is False (default), I use the painter's algorithm: the triangles are sorted by their depth and drawn
+from the farthest to the closest.
+If it is True, I use a depth buffer (z-buffer): the depth of every pixel is interpolated from the depths of the
+vertices of its triangle and a pixel is colored only if it is closer than what is already drawn there.
+In this case the triangles are not sorted and can be drawn in any order.
 
+backend is the name of the rasterization backend that colors the triangles (see backends.py):
+"reference" (f_shading or g_shading, one call per triangle), "numpy" (batch_shading, many triangles per NumPy call)
+or "tiled" (tiled_shading, tiles of the image colored in parallel by workers processes, by default one for each CPU).
+If backend is None (default), it is given by the environment variable RENDER_BACKEND, and otherwise it is
+"reference". All the backends give the same image (up to pixels where triangles have exactly the same depth).
+Only the reference backend supports the painter's algorithm: the others always use a depth buffer.
 
-def render_img(faces, vertices, vcolors, depth, shading):
-    # M = 512 = canvas height  ,  N = 512 = canvas width
-    img = []
-    # I create the canvas.
-    for i in range(512):
-        img.append([])
-        for j in range(512):
-            img[i].append([])
-            # The background of the canvas is white.
-            img[i][j] = [1, 1, 1]
-    updated_img = img.copy()
-    t_colors = []  # contains the color (i.e., a 1x3 vector) of each vertex of a triangle.
-    # Each element in a row of the t_colors array is a 1x3 vector. Each row refers to one triangle.
-    # Therefore, a row of the t_colors array has the following format: [[1x3 vector], [1x3 vector], [1x3 vector]].
-
-    t_depths = []  # It contains the depths of the triangles.
-    info1 = []  # In this list, I save the arrays t_depths and t_colors.
-    info2 = []  # In this list, I save the arrays t_depths and faces.
-
-    for i in range(len(faces)):
-        # vcolors[faces[i][0]] --> It provides the color vector of the 'faces[i][0]' vertex (faces[i][0] is an integer).
-        t_colors.append([vcolors[faces[i][0]], vcolors[faces[i][1]], vcolors[faces[i][2]]])
-        # depth[faces[i][0]] --> It provides the depth of the 'faces[i][0]' vertex
-        # The depth of a triangle is calculated as the centroid of the depths of its vertices.
-        t_depths.append((depth[faces[i][0]] + depth[faces[i][1]] + depth[faces[i][2]]) / 3)
-        # The first element of each row of the info1 array represents the depth of a triangle.
-        info1.append([t_depths[i], t_colors[i]])
-        for j in range(3):
-            # The element faces[i][j] is no longer equal to an integer k.
-            # Instead, it equals the coordinates of the k-th vertex of the vertices array.
-            faces[i][j] = vertices[faces[i][j]]
-
-        # The first element of each row of the info2 array represents the depth of a triangle.
-        info2.append([t_depths[i], faces[i]])
-
-    # I am performing descending sorting with respect to the first element of each row of the array info1.
-    info1.sort(reverse=True, key=lambda k: k[0])
-    # I am performing descending sorting with respect to the first element of each row of the array info2.
-    info2.sort(reverse=True, key=lambda k: k[0])
-    # Thus, I ensured that the depths are sorted from largest to smallest in the arrays info1 and info2.
-    # Also, the color vectors and vertices coordinates of the triangles were sorted based on their corresponding depth.
-
-    # I store the depths of the triangles, the color vectors, and the vertices coordinates in their new sorted order.
-    new_t_depths, new_t_colors, new_faces = [], [], []
-    for elem in info1:
-        new_t_depths.append(elem[0])
-        new_t_colors.append(elem[1])
-    for elem in info2:
-        new_faces.append(elem[1])
+state is an optional RenderState (see incremental.py) for incremental rendering, e.g. for successive renders of a
+scene that is edited or animated in part. It keeps the image and the depth buffer of the previous render and only
+the dirty parts of the image (around the triangles that were added, removed or changed) are colored again
+(with batch_shading, whatever the backend). The same state must be given to every render of the sequence.
+
+stats is an optional RenderStats object (see render_stats.py) for instrumentation. If it is given, the wall time of
+the stages of render_img ("setup" and "shading", which includes the "sort" of the painter's algorithm) and the
+counters of the triangles and pixels (submitted, drawn, fragments, pixels shaded and overdraw) are added to it,
+while the image is returned as usual. Without stats, nothing is measured.
+"""
 
+
+def render_img(faces, vertices, vcolors, depth, shading, res_h=512, res_w=512, zbuffer=False, backend=None,
+               workers=None, state=None, stats=None):
     if shading != "f" and shading != "g":
-        print('An error occurred: shading must be "f" or "g"')
-        return 1
-    elif shading == "f":
-        for face in new_faces:
-            index = 0
-            for j in new_faces:
-                # Find the index of the "face" in the new_faces array.
-                # "face" is a list containing the 2D coordinates of the 3 vertices of a triangle.
-                if face != j:
-                    index += 1
-                else:
-                    break
-            updated_img = f_shading(img, face, new_t_colors[index])
-    elif shading == "g":
-        for face in new_faces:
-            index = 0
-            for j in new_faces:
-                # Find the index of the "face" in the new_faces array.
-                # "face" is a list containing the 2D coordinates of the 3 vertices of a triangle.
-                if face != j:
-                    index += 1
-                else:
-                    break
-            updated_img = g_shading(img, face, new_t_colors[index])
+        raise ValueError('shading must be "f" or "g"')
+    # The backend function, and whether it supports the painter's algorithm
+    _, (render, painter) = get_backend(backend)
+
+    # The correct rendering of the image's fish is achieved by reflecting the x-coordinates of the vertices
+    # (x -> M - x). Otherwise, the fish will appear "upside down".
+    vertices = np.array(vertices)
+    vertices[:, 0] = res_h - vertices[:, 0]
+
+    # The stages are timed only if stats are collected.
+    stage = stats.stage if stats is not None else nullcontext
+
+    with stage("setup"):
+        faces = np.asarray(faces, dtype=np.intp).reshape(-1, 3)
+        vcolors = np.asarray(vcolors)
+        depth = np.asarray(depth, dtype=np.float64)
+
+        # The vertices, colors and depths of every triangle are gathered together (K × 3 × 2, K × 3 × 3 and K × 3).
+        # t_vertices[k] is a 3x2 array with the coordinates of the 3 vertices of the k-th triangle.
+        # t_colors[k] is a 3x3 array with the color vectors of the 3 vertices of the k-th triangle.
+        t_vertices = vertices[faces]
+        t_colors = vcolors[faces]
+        t_depths = depth[faces]
+
+    if stats is not None:
+        stats.submitted += len(faces)
+        shaded_before = stats.pixels_shaded
+
+    if state is not None:
+        with stage("shading"):
+            return state.render(t_vertices, t_colors, t_depths, shading, res_h, res_w, stats)
+
+    # M = res_h = canvas height  ,  N = res_w = canvas width
+    # I create the canvas (the state keeps its own). The background of the canvas is white.
+    img = np.ones((res_h, res_w, 3), dtype=np.float32)
+
+    # The depth buffer initially contains infinite depth (i.e., nothing has been drawn yet).
+    # Without zbuffer, a backend that supports it uses the painter's algorithm, without a depth buffer.
+    zbuf = np.full((res_h, res_w), np.inf) if zbuffer or not painter else None
+    if stats is not None and zbuf is None:
+        # Without a depth buffer, the shading functions mark the pixels they color in a coverage image.
+        stats.coverage = np.zeros((res_h, res_w), dtype=bool)
+
+    with stage("shading"):
+        updated_img = render(img, zbuf, t_vertices, t_colors, t_depths, shading, stats, workers)
 
+    if stats is not None:
+        # The covered pixels are the ones with a finite depth (or the ones of the coverage image).
+        stats.add_overdraw(shaded_before, np.isfinite(zbuf) if zbuf is not None else stats.coverage)
+        stats.coverage = None
     return updated_img
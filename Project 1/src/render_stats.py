@@ -0,0 +1,94 @@
+import time
+from contextlib import contextmanager
+import numpy as np
+
+"""
+The class RenderStats collects instrumentation of the rendering pipeline: the wall time of every stage and counters
+of the triangles and pixels. It is opt-in: an object of the class is given with the argument stats to render_img
+(and render_object / render_animation in Project 2), which fill it in while they render, next to the image they
+return. When stats is not given, nothing is measured.
+The times and the counters are accumulated, so a single object can collect the statistics of many renders
+(e.g. all the frames of an animation).
+
+times is a dictionary with the total wall time (in seconds) of every stage, in the order the stages ran.
+The stage function is a context manager that adds the time of the code in its with block to a stage.
+The counters are:
+submitted: the number of triangles submitted to render_img,
+culled: the number of triangles dropped before render_img (by cull_triangles), with the numbers of each test in
+the dictionary culled_by,
+drawn: the number of triangles that colored at least one pixel (each triangle is counted once, also when the image
+is colored in parts, e.g. in the tiles of the tiled backend),
+fragments: the number of pixels found inside the triangles (before the depth test),
+pixels_shaded: the number of pixels that were colored (written in the image), and
+overdraw: the number of times a pixel was colored again in the same render (pixels_shaded minus the pixels colored
+at least once).
+The functions add_culled, add_pixels and add_overdraw are used by the rendering functions to update the counters.
+The as_dict function returns all of them in a dictionary (e.g. to be saved as JSON).
+"""
+
+
+class RenderStats:
+    def __init__(self):
+        self.times = {}
+        self.submitted = 0
+        self.culled = 0
+        self.culled_by = {}
+        self.drawn = 0
+        self.fragments = 0
+        self.pixels_shaded = 0
+        self.overdraw = 0
+        # A boolean M × N image with the pixels colored in the current render (used by the painter's algorithm,
+        # which has no depth buffer to tell which pixels were colored).
+        self.coverage = None
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.times[name] = self.times.get(name, 0.0) + time.perf_counter() - start
+
+    def add_culled(self, culled):
+        # culled is the dictionary of cull_triangles, with the number of triangles dropped by each test.
+        for reason, count in culled.items():
+            self.culled_by[reason] = self.culled_by.get(reason, 0) + count
+            self.culled += count
+
+    def add_pixels(self, rows, cols, mask, fragments):
+        # The pixels image[rows, cols][mask] were colored and fragments pixels were inside the triangle.
+        # I return the number of colored pixels.
+        shaded = int(np.count_nonzero(mask))
+        self.fragments += int(fragments)
+        self.pixels_shaded += shaded
+        if self.coverage is not None:
+            self.coverage[rows, cols] |= mask
+        return shaded
+
+    def add_overdraw(self, shaded_before, covered):
+        # The overdraw of a render: the pixels colored in it (the pixels_shaded since shaded_before) minus the
+        # pixels it covered (covered is a boolean image, or a part of it).
+        self.overdraw += self.pixels_shaded - shaded_before - int(np.count_nonzero(covered))
+
+    def merge(self, other):
+        # I add the times and the counters of another RenderStats object (e.g. one filled in a worker process).
+        for name, seconds in other.times.items():
+            self.times[name] = self.times.get(name, 0.0) + seconds
+        self.add_culled(other.culled_by)
+        self.submitted += other.submitted
+        self.drawn += other.drawn
+        self.fragments += other.fragments
+        self.pixels_shaded += other.pixels_shaded
+        self.overdraw += other.overdraw
+
+    def as_dict(self):
+        return {"times": dict(self.times), "submitted": self.submitted, "culled": self.culled,
+                "culled_by": dict(self.culled_by), "drawn": self.drawn, "fragments": self.fragments,
+                "pixels_shaded": self.pixels_shaded, "overdraw": self.overdraw}
+
+    def __repr__(self):
+        times = ", ".join("{}={:.4f}s".format(name, seconds) for name, seconds in self.times.items())
+        return ("RenderStats(submitted={}, culled={}, drawn={}, fragments={}, pixels_shaded={}, overdraw={}, "
+                "times: {})".format(self.submitted, self.culled, self.drawn, self.fragments, self.pixels_shaded,
+                                     self.overdraw, times))
+
@@ -0,0 +1,199 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, util
+import numpy as np
+from barycentric import pixel_boxes
+from batch_shading import batch_shading
+from render_stats import RenderStats
+
+"""
+tiled_shading function:
+
+The tiled_shading function has the same input arguments as the function batch_shading and it colors the triangles
+in parallel, in worker processes.
+The image is split into tiles of tile_size × tile_size pixels and every triangle is assigned (binned) to the tiles
+that its bounding box overlaps. Each tile is then colored by batch_shading in a ProcessPoolExecutor with workers
+processes (by default, one for each CPU), using only the triangles of the tile.
+
+The image, the depth buffer and the triangle data are placed in shared memory (multiprocessing.shared_memory).
+The workers write the pixels of their tiles directly into the shared image, so no pixel data is pickled back.
+Every tile has its own part of the depth buffer, so the tiles do not depend on each other and can be colored in
+any order. When all the tiles are colored, the shared image and depth buffer are copied back into img and zbuf.
+If stats (a RenderStats object) is given, every worker counts the pixels and triangles of its tiles in a RenderStats
+object of its own, which is sent back and merged into stats, with the indices of the triangles that colored a pixel
+of the tile: a triangle is counted in stats.drawn once, even if it colors many tiles.
+
+The process pool and the shared memory blocks are kept alive between calls, so that the frames of an animation
+(or any sequence of renders) do not start new worker processes and create new blocks every time: the pool is created
+by the first call (and again only when a different number of workers is asked for) and a block is created again only
+when its array no longer fits in it (e.g. a larger image or more triangles). The workers attach to the blocks by name
+and keep them attached until they are replaced. The function shutdown_workers stops the pool and frees the blocks
+(it is also called when the process that created them exits, e.g. a worker of render_frames_parallel).
+"""
+
+
+def tiled_shading(img, zbuf, vertices, vcolors, depths, shading, tile_size=64, workers=None, stats=None):
+    M, N = img.shape[:2]
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3, 2)
+    vcolors = np.asarray(vcolors).reshape(-1, 3, 3)
+    depths = np.asarray(depths, dtype=np.float64).reshape(-1, 3)
+
+    tiles = _bin_triangles(vertices, M, N, tile_size)
+    if not tiles:
+        return img
+
+    # I copy the arrays into the shared memory blocks. The workers attach to them by name.
+    arrays = {"img": img, "zbuf": zbuf, "vertices": vertices, "vcolors": vcolors, "depths": depths}
+    specs = {name: _share(name, array) for name, array in arrays.items()}
+
+    executor = _get_executor(workers or os.cpu_count() or 1)
+    # Each task is a tile (its pixel ranges and the indices of its triangles).
+    chunksize = max(len(tiles) // (4 * _executor_workers), 1)
+    drawn = np.zeros(len(vertices), dtype=bool)  # The triangles that colored at least one pixel
+    for tile_stats, tile_drawn in executor.map(_shade_tile, tiles, [specs] * len(tiles), [shading] * len(tiles),
+                                               [stats is not None] * len(tiles), chunksize=chunksize):
+        if stats is not None:
+            stats.merge(tile_stats)
+            drawn[tile_drawn] = True
+    if stats is not None:
+        stats.drawn += int(np.count_nonzero(drawn))
+
+    img[...] = _view(_blocks["img"], specs["img"])
+    zbuf[...] = _view(_blocks["zbuf"], specs["zbuf"])
+    return img
+
+
+def shutdown_workers():
+    # I stop the process pool and free the shared memory blocks (the next call of tiled_shading creates them again).
+    global _executor
+    if _owner != os.getpid():
+        return  # The pool and the blocks belong to the parent process (this is a forked copy of its state).
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+    for block in _blocks.values():
+        block.close()
+        block.unlink()
+    _blocks.clear()
+
+
+# The process pool, its number of workers and the shared memory blocks (by array name) of this process.
+# _owner is the process that created them: a process forked from it (e.g. a worker of render_frames_parallel)
+# inherits these variables, but it must create a pool and blocks of its own.
+_executor = None
+_executor_workers = None
+_blocks = {}
+_owner = None
+
+
+def _get_executor(workers):
+    global _executor, _executor_workers
+    _check_owner()
+    if _executor is None or _executor_workers != workers:
+        if _executor is not None:
+            _executor.shutdown()
+        _executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+        _executor_workers = workers
+    return _executor
+
+
+def _share(name, array):
+    # I copy array into the shared memory block of name (a new, larger block if it does not fit) and return the
+    # spec (block name, shape, dtype) with which the workers find it.
+    _check_owner()
+    block = _blocks.get(name)
+    if block is None or block.size < array.nbytes:
+        if block is not None:
+            block.close()
+            block.unlink()
+        # The block is created with some room to spare, so that a slightly larger array still fits next time.
+        size = max(array.nbytes, 2 * block.size if block is not None else 1)
+        block = _blocks[name] = shared_memory.SharedMemory(create=True, size=size)
+    spec = (block.name, array.shape, array.dtype.str)
+    _view(block, spec)[...] = array
+    return spec
+
+
+def _check_owner():
+    global _executor, _executor_workers, _owner
+    if _owner != os.getpid():
+        # A forked process drops (without closing) the pool and the blocks of its parent.
+        _executor, _executor_workers, _owner = None, None, os.getpid()
+        _blocks.clear()
+        # The pool and the blocks of this process are freed when it exits. A finalizer of multiprocessing runs before
+        # a process joins its child processes, so a worker process that used tiled_shading does not wait forever
+        # for the workers of its own pool. Its priority is higher than the one of the queues of the pool (10),
+        # so that the pool is shut down before its queues are closed.
+        util.Finalize(None, shutdown_workers, exitpriority=100)
+
+
+def _view(block, spec):
+    # The array of a spec in its shared memory block.
+    _, shape, dtype = spec
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+
+def _bin_triangles(vertices, M, N, tile_size):
+    # The bounding box of the pixels of each triangle, clipped to the image.
+    x_min, x_max, y_min, y_max = pixel_boxes(vertices, M, N)
+    keep = np.nonzero((x_min <= x_max) & (y_min <= y_max))[0]
+
+    # The range of tiles that the bounding box of each triangle overlaps.
+    tiles_x = -(-N // tile_size)  # The number of tiles in each row of tiles.
+    tx0, tx1 = x_min[keep] // tile_size, x_max[keep] // tile_size
+    ty0, ty1 = y_min[keep] // tile_size, y_max[keep] // tile_size
+    counts = (tx1 - tx0 + 1) * (ty1 - ty0 + 1)
+
+    # One (tile, triangle) pair for every tile a triangle overlaps.
+    pair_triangle = np.repeat(np.arange(len(keep)), counts)
+    offset = np.arange(len(pair_triangle)) - np.repeat(np.cumsum(counts) - counts, counts)
+    span = (ty1 - ty0 + 1)[pair_triangle]
+    pair_tile = (tx0[pair_triangle] + offset // span) * tiles_x + ty0[pair_triangle] + offset % span
+
+    order = np.argsort(pair_tile, kind="stable")
+    pair_tile, pair_triangle = pair_tile[order], keep[pair_triangle[order]]
+    tile_ids, starts = np.unique(pair_tile, return_index=True)
+    ends = np.append(starts[1:], len(pair_tile))
+
+    tiles = []
+    for tile_id, start, end in zip(tile_ids, starts, ends):
+        x0 = int(tile_id // tiles_x) * tile_size
+        y0 = int(tile_id % tiles_x) * tile_size
+        tiles.append((x0, min(x0 + tile_size, M), y0, min(y0 + tile_size, N), pair_triangle[start:end]))
+    return tiles
+
+
+# The shared memory blocks that a worker process has attached to (by block name).
+_worker_blocks = {}
+
+
+def _init_worker():
+    # A worker is forked with a copy of the blocks of the process that created the pool, which it drops (so that
+    # they are not kept mapped after they are replaced): it attaches to the blocks it needs by name.
+    _blocks.clear()
+
+
+def _worker_arrays(specs):
+    # The arrays of a task, in the shared memory blocks of its specs. A block that the worker has not seen yet is
+    # attached, and the blocks that are no longer used (they were replaced by larger ones) are closed.
+    names = {block_name for block_name, _, _ in specs.values()}
+    for block_name in list(_worker_blocks):
+        if block_name not in names:
+            _worker_blocks.pop(block_name).close()
+    for block_name in names - _worker_blocks.keys():
+        _worker_blocks[block_name] = shared_memory.SharedMemory(name=block_name)
+    return {name: _view(_worker_blocks[spec[0]], spec) for name, spec in specs.items()}
+
+
+def _shade_tile(tile, specs, shading, collect_stats):
+    x0, x1, y0, y1, triangles = tile
+    arrays = _worker_arrays(specs)
+    stats = RenderStats() if collect_stats else None
+    drawn = np.zeros(len(triangles), dtype=bool)
+    # The tile is colored as an image of its own: its vertices are moved to the coordinates of the tile,
+    # and batch_shading writes into the views of the tile in the shared image and depth buffer.
+    vertices = arrays["vertices"][triangles] - np.array([x0, y0], dtype=np.float64)
+    batch_shading(arrays["img"][x0:x1, y0:y1], arrays["zbuf"][x0:x1, y0:y1],
+                  vertices, arrays["vcolors"][triangles], arrays["depths"][triangles], shading, stats, drawn)
+    # The indices of the triangles that colored a pixel of the tile (stats.drawn is counted by tiled_shading).
+    return stats, triangles[drawn]
@@ -0,0 +1,147 @@
+import numpy as np
+from barycentric import pixel_boxes
+from f_shading import f_shading
+from g_shading import g_shading
+"""
+batch_shading function:
+
+The batch_shading function colors many triangles at once, instead of calling f_shading or g_shading once per triangle.
+img is the M × N × 3 image and zbuf is its M × N depth buffer (both are updated in place).
+vertices is a K × 3 × 2 array with the 2D coordinates of the vertices of K triangles,
+vcolors is a K × 3 × 3 array with the colors of their vertices and depths is a K × 3 array with their depths.
+shading takes the value "f" or "g" (flat or Gouraud shading, as in f_shading and g_shading).
+The function returns the image.
+
+The triangles are grouped by the size of their bounding box (rounded up to powers of 2).
+The triangles of a group are rasterized together in stacked NumPy arrays (triangles × bounding box pixels), with the
+same edge functions and top-left fill rule as triangle_blocks, so most meshes (whose triangles cover only a few
+pixels) need a few NumPy calls for thousands of triangles.
+A NumPy call never rasterizes more than MAX_BATCH_PIXELS bounding box pixels: the groups are split into chunks of
+triangles, and a triangle whose (rounded) bounding box is larger than that is colored alone by f_shading or g_shading,
+which rasterize it in blocks of rows of its actual bounding box (see triangle_blocks). So the memory used stays
+bounded even for triangles that cover a whole 4K frame.
+The colored pixels (fragments) are then written to the image with a depth test: for every pixel, the closest
+fragment is kept and it is drawn only if it is closer than the depth already stored in zbuf.
+So the visibility is always resolved with the depth buffer and the order of the triangles does not matter.
+stats (optional) is a RenderStats object (see render_stats.py), whose counters of pixels and triangles are updated.
+drawn (optional, used with stats) is a boolean array of K elements: the triangles that color at least one pixel are
+marked in it (True) instead of being counted in stats.drawn, so that a caller that colors the image in parts with
+several calls (the tiles of tiled_shading or the rectangles of RenderState) can count every triangle once.
+"""
+
+# The maximum number of bounding box pixels rasterized in a single NumPy call (it bounds the memory used).
+MAX_BATCH_PIXELS = 1 << 18
+
+
+def batch_shading(img, zbuf, vertices, vcolors, depths, shading, stats=None, drawn=None):
+    M, N = img.shape[:2]
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3, 2)
+    vcolors = np.asarray(vcolors).reshape(-1, 3, 3)
+    depths = np.asarray(depths, dtype=np.float64).reshape(-1, 3)
+
+    # Twice the signed area of each triangle. Triangles with zero area cover no pixels.
+    x1, y1 = vertices[:, 0, 0], vertices[:, 0, 1]
+    x2, y2 = vertices[:, 1, 0], vertices[:, 1, 1]
+    x3, y3 = vertices[:, 2, 0], vertices[:, 2, 1]
+    area = (x2 - x1) * (y3 - y1) - (x3 - x1) * (y2 - y1)
+
+    # The bounding box of the pixels of each triangle, clipped to the image.
+    x_min, x_max, y_min, y_max = pixel_boxes(vertices, M, N)
+
+    keep = np.nonzero((area != 0) & (x_min <= x_max) & (y_min <= y_max))[0]
+    if len(keep) == 0:
+        return img
+
+    # I group the triangles by the size of their bounding box, rounded up to a power of 2.
+    log_h = np.ceil(np.log2(x_max[keep] - x_min[keep] + 1)).astype(np.intp)
+    log_w = np.ceil(np.log2(y_max[keep] - y_min[keep] + 1)).astype(np.intp)
+    groups = log_h * 64 + log_w
+    order = keep[np.argsort(groups, kind="stable")]
+    groups = np.sort(groups, kind="stable")
+    starts = np.nonzero(np.diff(groups, prepend=-1))[0]
+    ends = np.append(starts[1:], len(order))
+
+    for start, end in zip(starts, ends):
+        box_h = 1 << int(groups[start] // 64)
+        box_w = 1 << int(groups[start] % 64)
+        if box_h * box_w > MAX_BATCH_PIXELS:
+            # The large triangles are colored one by one, in blocks of rows (there are few of them, so the loop
+            # costs little, and their pixels are not rounded up to a power of 2).
+            shade = f_shading if shading == "f" else g_shading
+            for k in order[start:end]:
+                drawn_before = stats.drawn if stats is not None else 0
+                shade(img, vertices[k], vcolors[k], depths[k], zbuf, stats)
+                if drawn is not None and stats is not None:
+                    drawn[k] |= stats.drawn > drawn_before
+                    stats.drawn = drawn_before
+            continue
+        # I split the group in chunks, so that a NumPy call never rasterizes more than MAX_BATCH_PIXELS pixels.
+        chunk = MAX_BATCH_PIXELS // (box_h * box_w)
+        for chunk_start in range(start, end, chunk):
+            idx = order[chunk_start:min(chunk_start + chunk, end)]
+            px, py, t, weights = _rasterize_group(vertices[idx], area[idx], x_min[idx], x_max[idx],
+                                                  y_min[idx], y_max[idx], box_h, box_w)
+            if len(t) == 0:
+                continue
+            t = idx[t]
+            z = np.einsum("ij,ij->i", weights, depths[t])
+            if shading == "f":
+                # Flat shading: the average of the colors of the 3 vertices.
+                colors = (vcolors[t, 0] + vcolors[t, 1] + vcolors[t, 2]) / 3
+            else:
+                # Gouraud shading: the weighted sum of the colors of the 3 vertices.
+                colors = np.einsum("ij,ijk->ik", weights, vcolors[t])
+            shaded = _resolve_depth(img, zbuf, px, py, z, colors)
+            if stats is not None:
+                stats.fragments += len(t)
+                stats.pixels_shaded += len(shaded)
+                if drawn is not None:
+                    drawn[t[shaded]] = True
+                else:
+                    stats.drawn += len(np.unique(t[shaded]))
+
+    return img
+
+
+def _rasterize_group(vertices, area, x_min, x_max, y_min, y_max, box_h, box_w):
+    # The pixels of the bounding boxes, stacked in T × box_h × box_w arrays.
+    x = (x_min[:, None, None] + np.arange(box_h)[None, :, None]).astype(np.float64)
+    y = (y_min[:, None, None] + np.arange(box_w)[None, None, :]).astype(np.float64)
+    sign = np.where(area > 0, 1.0, -1.0)[:, None, None]
+
+    x1, y1 = vertices[:, 0, 0, None, None], vertices[:, 0, 1, None, None]
+    x2, y2 = vertices[:, 1, 0, None, None], vertices[:, 1, 1, None, None]
+    x3, y3 = vertices[:, 2, 0, None, None], vertices[:, 2, 1, None, None]
+
+    # The edge functions, positive inside the triangles (the same expressions as in triangle_blocks).
+    w1 = ((x2 - x) * (y3 - y) - (x3 - x) * (y2 - y)) * sign
+    w2 = ((x3 - x) * (y1 - y) - (x1 - x) * (y3 - y)) * sign
+    w3 = ((x1 - x) * (y2 - y) - (x2 - x) * (y1 - y)) * sign
+
+    # Only the pixels of the actual (clipped) bounding box of each triangle are considered.
+    inside = (x <= x_max[:, None, None]) & (y <= y_max[:, None, None])
+    for w, a, b in ((w1, 1, 2), (w2, 2, 0), (w3, 0, 1)):
+        # The top-left fill rule for the edge (a -> b), directed so that the interior is on its left.
+        d_x = (vertices[:, b, 0] - vertices[:, a, 0]) * sign[:, 0, 0]
+        d_y = (vertices[:, b, 1] - vertices[:, a, 1]) * sign[:, 0, 0]
+        top_left = ((d_x > 0) | ((d_x == 0) & (d_y < 0)))[:, None, None]
+        inside &= (w > 0) | (top_left & (w == 0))
+
+    t, i, j = np.nonzero(inside)
+    weights = np.stack((w1[t, i, j], w2[t, i, j], w3[t, i, j]), axis=-1) / np.abs(area[t])[:, None]
+    return x_min[t] + i, y_min[t] + j, t, weights
+
+
+def _resolve_depth(img, zbuf, px, py, z, colors):
+    # For every pixel, I keep the closest fragment (for equal depths, the one of the first triangle).
+    pixel = px * zbuf.shape[1] + py
+    order = np.lexsort((z, pixel))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = pixel[order[1:]] != pixel[order[:-1]]
+    closest = order[first]
+
+    # The closest fragment is drawn only if it is closer than the depth already stored in the depth buffer.
+    closest = closest[z[closest] < zbuf[px[closest], py[closest]]]
+    zbuf[px[closest], py[closest]] = z[closest]
+    img[px[closest], py[closest]] = colors[closest]
+    return closest  # The indices of the fragments that were drawn
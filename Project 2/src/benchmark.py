@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+from f_shading import f_shading
+from functions import Transform, perspective_project, lookat, render_object
+from g_shading import g_shading
+from line_drawing import line_drawing, line_points_batch
+from render_img import render_img
+from render_stats import RenderStats
+from scenes import triangle_soup, sphere, camera, project_scene, hw1_scene, hw2_scene
+from vector_interp import vector_interp
+
+"""
+The benchmark suite of the rasterization and transform hot paths.
+
+It measures line_drawing (and line_points_batch), vector_interp, f_shading and g_shading (one call per triangle),
+render_img with every backend (reference with the painter's algorithm and with a z-buffer, numpy and tiled),
+Transform.transform_pts,
+perspective_project and render_object, on the synthetic scenes of scenes.py (random triangle soups with tiny, small
+and large triangles, tessellated spheres of 1k to 1M triangles, at several resolutions) and on the bundled scenes
+hw1.npy and hw2.npy.
+
+Every benchmark runs repeat times and the best (smallest) wall time is kept. The throughput is reported in
+triangles/s and pixels/s (the pixels inside the triangles, counted once with a RenderStats object in a separate
+run, so that the counting does not affect the timed runs), or in points/s or calls/s.
+The results are printed and saved as JSON (with the commit, the versions of Python and NumPy and the machine),
+so that the results of different commits can be compared with --compare.
+
+Usage (from this directory):
+python benchmark.py                       runs the whole suite and saves benchmark.json
+python benchmark.py --quick               runs smaller scenes (for a quick check)
+python benchmark.py --only render_img     runs only the benchmarks whose name contains "render_img"
+python benchmark.py --output new.json --compare old.json
+                                          saves new.json and prints the speedup of every benchmark against old.json
+"""
+
+
+def run_suite(quick=False, repeat=3, only=None):
+    results = []
+
+    def record(name, fn, counts, params=None):
+        # counts is a dictionary with the number of items (e.g. triangles or pixels) processed by one run of fn,
+        # or a function that returns it (so that it is computed only for the benchmarks that run).
+        if only and not any(pattern in name for pattern in only):
+            return
+        seconds = _best_time(fn, repeat)
+        counts = {unit: int(count) for unit, count in (counts() if callable(counts) else counts).items()}
+        result = {"name": name, "params": params or {}, "seconds": seconds, "counts": counts,
+                  "throughput": {unit + "/s": count / seconds for unit, count in counts.items()}}
+        results.append(result)
+        print("{:55s} {:10.4f} s  {}".format(name, seconds, "  ".join(
+            "{:.3g} {}".format(rate, unit) for unit, rate in result["throughput"].items())))
+
+    n_small = 2000 if quick else 20000
+    n_large = 20000 if quick else 200000
+    sphere_sizes = (1000, 10000, 100000) if quick else (1000, 10000, 100000, 1000000)
+    resolutions = (256, 512) if quick else (256, 512, 1024)
+
+    # Lines: random segments of up to 64 pixels.
+    rng = np.random.default_rng(0)
+    starts = rng.integers(0, 512, (n_small // 10, 2))
+    ends = starts + rng.integers(-64, 65, starts.shape)
+    n_points = len(line_points_batch(starts, ends)[0])
+    segments = list(zip(starts.tolist(), ends.tolist()))
+    record("line_drawing", lambda: [line_drawing(a, b) for a, b in segments],
+           {"segments": len(segments), "pixels": n_points})
+    record("line_points_batch", lambda: line_points_batch(starts, ends),
+           {"segments": len(segments), "pixels": n_points})
+
+    # vector_interp: interpolation of colors at points of random segments.
+    p1, p2 = rng.uniform(0, 512, (2, n_small, 2))
+    V1, V2 = rng.random((2, n_small, 3))
+    coords = (p1[:, 0] + p2[:, 0]) / 2
+    record("vector_interp",
+           lambda: [vector_interp(p1[i], p2[i], V1[i], V2[i], coords[i], 1) for i in range(n_small)],
+           {"calls": n_small})
+
+    # The shading functions, one call per triangle (with a depth buffer), on soups of tiny, small and large triangles.
+    soups = {"tiny": (0.5, 4), "small": (4, 16), "large": (16, 128)}
+    for label, (min_size, max_size) in soups.items():
+        n = n_small if label != "large" else n_small // 10
+        scene = triangle_soup(n, min_size=min_size, max_size=max_size)
+        triangles = _scene_triangles(scene)
+        counts = _render_counts(lambda stats: render_img(*scene, "g", backend="numpy", stats=stats), n)
+        for shade in (f_shading, g_shading):
+            record("{}/soup-{}-{}".format(shade.__name__, label, n), lambda: _shade_all(shade, triangles),
+                   counts, {"min_size": min_size, "max_size": max_size})
+
+    # render_img with every backend (the backend is always given, so RENDER_BACKEND does not change the benchmarks).
+    modes = {"painter": {"backend": "reference"}, "zbuffer": {"backend": "reference", "zbuffer": True},
+             "numpy": {"backend": "numpy"}, "tiled": {"backend": "tiled"}}
+    for label, (min_size, max_size) in soups.items():
+        n = n_small if label != "large" else n_small // 10
+        scene = triangle_soup(n, min_size=min_size, max_size=max_size)
+        _record_render_img(record, "soup-{}-{}".format(label, n), scene, modes)
+    _record_render_img(record, "hw1", hw1_scene(), modes)
+
+    # The fast backends on a large soup, at several resolutions.
+    for res in resolutions:
+        scene = triangle_soup(n_large, res, res, min_size=0.5 * res / 512, max_size=8 * res / 512)
+        _record_render_img(record, "soup-{}@{}".format(n_large, res), scene,
+                           {"numpy": modes["numpy"], "tiled": modes["tiled"]}, res)
+
+    # The transforms and the projection of many points.
+    pts = rng.uniform(-1, 1, (3, 10 * n_large))
+    transform = Transform().rotate(0.5, np.array([1.0, 1.0, 0.0])).translate(np.array([0.1, 0.2, 0.3]))
+    record("Transform.transform_pts", lambda: transform.transform_pts(pts), {"points": pts.shape[1]})
+    plane_h, plane_w, res_h, res_w, focal, eye, up, target = camera()
+    R, t = lookat(eye, up, target)
+    record("perspective_project", lambda: perspective_project(pts, focal, R, t), {"points": pts.shape[1]})
+
+    # render_object on the spheres and on hw2.npy (the per-triangle reference only on the smaller spheres).
+    for n_faces in sphere_sizes:
+        mesh = sphere(n_faces)
+        for res in resolutions:
+            cam = camera(res, res)
+            object_modes = {"numpy": modes["numpy"]}
+            if n_faces <= 10000 and res == 512:
+                object_modes = {"zbuffer": modes["zbuffer"], **object_modes}
+            for mode, options in object_modes.items():
+                _record_render_object(record, "render_object/{}/sphere-{}@{}".format(mode, len(mesh[2]), res),
+                                      mesh, cam, options)
+        # The 2D stages alone (without the projection), for the same sphere.
+        if n_faces == sphere_sizes[-1]:
+            _record_render_img(record, "sphere-{}".format(len(mesh[2])), project_scene(*mesh, *camera()),
+                               {"numpy": modes["numpy"]})
+    hw2 = hw2_scene()
+    mesh = (hw2["v_pos"], hw2["v_clr"], hw2["t_pos_idx"])
+    cam = tuple(hw2[name] for name in ("plane_h", "plane_w", "res_h", "res_w", "focal", "eye", "up", "target"))
+    for mode, options in modes.items():
+        _record_render_object(record, "render_object/{}/hw2".format(mode), mesh, cam, options)
+
+    return results
+
+
+def _record_render_img(record, label, scene, modes, res=512):
+    counts = _render_counts(lambda stats: render_img(*scene, "g", res, res, backend="numpy", stats=stats),
+                            len(scene[0]))
+    for mode, options in modes.items():
+        record("render_img/{}/{}".format(mode, label), lambda: render_img(*scene, "g", res, res, **options),
+               counts, {"res": res})
+
+
+def _record_render_object(record, name, mesh, cam, options):
+    counts = _render_counts(lambda stats: render_object(*mesh, *cam, stats=stats, backend="numpy"), len(mesh[2]))
+    record(name, lambda: render_object(*mesh, *cam, **options), counts, {"res": [int(cam[2]), int(cam[3])]})
+
+
+def _scene_triangles(scene):
+    # The vertices, colors and depths of every triangle of a scene (as render_img gives them to the shaders).
+    faces, vertices, vcolors, depth = scene
+    return vertices[faces], vcolors[faces], depth[faces]
+
+
+def _shade_all(shade, triangles):
+    img = np.ones((512, 512, 3), dtype=np.float32)
+    zbuf = np.full((512, 512), np.inf)
+    for vertices, vcolors, depths in zip(*triangles):
+        shade(img, vertices, vcolors, depths, zbuf)
+
+
+def _render_counts(render, triangles):
+    # A function that returns the counts of a render: its triangles and the pixels inside them, counted (once, when
+    # they are first needed) with a RenderStats object.
+    pixels = []
+
+    def counts():
+        if not pixels:
+            stats = RenderStats()
+            render(stats)
+            pixels.append(stats.fragments)
+        return {"triangles": triangles, "pixels": pixels[0]}
+    return counts
+
+
+def _best_time(fn, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def environment():
+    # The commit (if this is a git repository), the versions and the machine of the benchmark.
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "date": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "numpy": np.__version__, "machine": platform.machine(), "processor": platform.processor(),
+            "cpus": os.cpu_count(), "platform": platform.platform()}
+
+
+def compare(old, new):
+    # I print the speedup (old time / new time) of the benchmarks that are in both results.
+    old_times = {result["name"]: result["seconds"] for result in old["results"]}
+    print("\nSpeedup against {}:".format(old["environment"].get("commit")))
+    for result in new["results"]:
+        if result["name"] in old_times:
+            print("{:55s} {:8.2f}x".format(result["name"], old_times[result["name"]] / result["seconds"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the rasterization and transform hot paths.")
+    parser.add_argument("--quick", action="store_true", help="use smaller scenes")
+    parser.add_argument("--repeat", type=int, default=3, help="the number of runs of every benchmark")
+    parser.add_argument("--only", nargs="+", help="run only the benchmarks whose name contains one of these")
+    parser.add_argument("--output", default="benchmark.json", help="the JSON file of the results")
+    parser.add_argument("--compare", help="a JSON file of previous results to compare with")
+    args = parser.parse_args(argv)
+
+    report = {"environment": environment(), "quick": args.quick, "repeat": args.repeat,
+              "results": run_suite(args.quick, args.repeat, args.only)}
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print("\nThe results are saved in", args.output)
+
+    if args.compare:
+        with open(args.compare) as file:
+            compare(json.load(file), report)
+    return report
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,84 +1,58 @@
-import numpy as np
-import matplotlib.pyplot as plt
 from functions import Transform
-from functions import render_object
+from functions import render_animation
+from frame_writer import FrameWriter
+from mesh_io import load_mesh
+from render_stats import RenderStats
 
 """
-For each affine transformation, I create a new object of the Transform class. 
-I do this because all successive transformations accumulate in the mat matrix, 
-so in steps 2 and 3, instead of just translation t_1 and t_2 respectively, 
-we would also have an additional rotation (with rotation matrix R from step 1).
+The successive affine transformations accumulate: the transform of each step is the transform of the previous step
+followed by a new transformation (the rotation of step 1, followed by the translations t_1 and t_2 of steps 2 and 3).
+Each of them is a single 4x4 matrix that is applied to the original vertices v_pos.
+The 4 images (steps 0 to 3) are rendered as a batch by render_animation, with the same camera for all of them.
+They are saved as 0.png, 1.png, 2.png and 3.png by a FrameWriter, in the background while the next step is rendered.
+At the end, the time of every stage of the pipeline and the counters of triangles and pixels of all the steps
+(collected in a RenderStats object) are printed.
 """
 
 
 # Load data from the given file
-extracted_info = np.load("hw2.npy", allow_pickle=True)[()]
+# (hw2.npy is converted once to the directory hw2, whose arrays are memory-mapped)
+extracted_info = load_mesh("hw2.npy")
 
 # Extract data from the dictionary
-v_pos = np.array(extracted_info['v_pos'])
-v_clr = np.array(extracted_info['v_clr'])
-t_pos_idx = np.array(extracted_info['t_pos_idx'])
-eye = np.array(extracted_info['eye'])
-target = np.array(extracted_info['target'])
-up = np.array(extracted_info['up'])
-t_0 = np.array(extracted_info['t_0'])
-t_1 = np.array(extracted_info['t_1'])
-rot_axis_0 = np.array(extracted_info['rot_axis_0'])
-theta_0 = np.array(extracted_info['theta_0'])
+v_pos = extracted_info['v_pos']
+v_clr = extracted_info['v_clr']
+t_pos_idx = extracted_info['t_pos_idx']
+eye = extracted_info['eye']
+target = extracted_info['target']
+up = extracted_info['up']
+t_0 = extracted_info['t_0']
+t_1 = extracted_info['t_1']
+rot_axis_0 = extracted_info['rot_axis_0']
+theta_0 = extracted_info['theta_0']
 res_w = extracted_info['res_w']
 res_h = extracted_info['res_h']
 plane_w = extracted_info['plane_w']
 plane_h = extracted_info['plane_h']
 focal = extracted_info['focal']
 
-print("Step 0 in progress...")
-# Render the object and display/save the first image
-img_array = render_object(v_pos, v_clr, t_pos_idx, plane_h, plane_w, res_h, res_w, focal, eye, up, target)
-plt.imshow(img_array)
-plt.title('first image')
-plt.show()
-plt.imsave('0.jpg', np.array(img_array))
-print("Step 0 completed successfully!\n")
-
-print("Step 1 in progress...")
-# Create and apply affine transformation for rotation
-affine_transform_object1 = Transform()
-affine_transform_object1.rotate(theta_0, rot_axis_0)
-v_pos = affine_transform_object1.transform_pts(v_pos)
-
-# Render the object after rotation and display/save the image
-img_array = render_object(v_pos, v_clr, t_pos_idx, plane_h, plane_w, res_h, res_w, focal, eye, up, target)
-plt.imshow(img_array)
-plt.title('Rotation by angle theta around an axis parallel to rot_axis')
-plt.show()
-plt.imsave('1.jpg', np.array(img_array))
-print("Step 1 completed successfully!\n")
-
-print("Step 2 in progress...")
-# Create and apply affine transformation for translation (t_1)
-affine_transform_object2 = Transform()
-affine_transform_object2.translate(t_0)
-v_pos = affine_transform_object2.transform_pts(v_pos)
+# The transforms of the 4 steps
+transforms = [Transform()]  # Step 0: no transformation
+transforms.append(Transform().rotate(theta_0, rot_axis_0))  # Step 1: rotation
+transforms.append(transforms[-1].then(Transform().translate(t_0)))  # Step 2: translation by t_1
+transforms.append(transforms[-1].then(Transform().translate(t_1)))  # Step 3: translation by t_2
 
-# Render the object after the first translation and display/save the image
-img_array = render_object(v_pos, v_clr, t_pos_idx, plane_h, plane_w, res_h, res_w, focal, eye, up, target)
-plt.imshow(img_array)
-plt.title('Translation by t_1')
-plt.show()
-plt.imsave('2.jpg', np.array(img_array))
-print("Step 2 completed successfully!\n")
-
-print("Step 3 in progress...")
-# Create and apply affine transformation for translation (t_2)
-affine_transform_object3 = Transform()
-affine_transform_object3.translate(t_1)
-v_pos = affine_transform_object3.transform_pts(v_pos)
-
-# Render the object after the second translation and display/save the image
-img_array = render_object(v_pos, v_clr, t_pos_idx, plane_h, plane_w, res_h, res_w, focal, eye, up, target)
-plt.imshow(img_array)
-plt.title('Translation by t_2')
-plt.show()
-plt.imsave('3.png', np.array(img_array))
-print("Step 3 completed successfully!")
+stats = RenderStats()
+frames = render_animation(v_pos, v_clr, t_pos_idx, plane_h, plane_w, res_h, res_w, focal, transforms, eye, up, target,
+                          stats=stats)
 
+print("Step 0 in progress...")
+with FrameWriter('{}.png') as writer:
+    for step, img_array in enumerate(frames):
+        # Save the image of the step
+        writer.write(img_array)
+        print("Step %d completed successfully!\n" % step)
+        if step + 1 < len(transforms):
+            print("Step %d in progress..." % (step + 1))
+
+print(stats)
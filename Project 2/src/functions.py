@@ -1,3 +1,4 @@
+from contextlib import nullcontext
 import numpy as np
 from render_img import render_img
 
@@ -7,14 +8,27 @@ from render_img import render_img
 The class Transform contains as an attribute the matrix mat(4χ4), which represents an affine transform and 
 is initialized to the identity matrix I4. 
 
+The transforms are composed by matrix multiplication: each of the functions rotate, translate and scale
+multiplies mat from the left with the matrix of a new transform, so the new transform is applied after the ones
+already in mat. They return the object itself, so a whole chain of transforms can be written as
+Transform().rotate(theta, u).translate(t) and it is collapsed into a single 4x4 matrix.
+
 The rotate function calculates the rotation matrix corresponding to a clockwise rotation by an angle theta 
-about an axis defined by the unit vector u and then updates the mat matrix. 
-Then the mat matrix represents a rotation transform. 
+about an axis defined by the unit vector u and composes it with the mat matrix. 
+
+The translate function composes the mat matrix with the translation by the vector t. 
+
+The scale function composes the mat matrix with the scaling by the factor s (a number or a 1x3 vector, one factor
+for each axis).
 
-The translate function updates the mat matrix with the translation vector t. 
-Then the mat matrix represents a translation transform. 
+The compose function does the same for any 4x4 matrix mat given in homogeneous coordinates.
+
+The then function returns a new Transform that applies this transform and then the transform other.
+a @ b returns a new Transform with matrix a.mat @ b.mat (i.e., it applies b and then a), so a.then(b) equals b @ a.
 
 The transform_pts function applies the transformation matrix mat to the 3D points of the pts array it takes as input.
+The points are transformed with a single matrix multiplication and they can optionally be written into an existing
+3xN array out (for example, pts itself for an in-place transform). float32 points stay float32.
 """
 
 
@@ -39,61 +53,57 @@ class Transform:
                        (1 - np.cos(theta)) * u[2] * u[1] + np.sin(theta) * u[0],
                        (1 - np.cos(theta)) * u[2] ** 2 + np.cos(theta)])
 
-        # I appropriately update the transformation matrix mat with the rotation matrix R according to equation 5.49
-        self.mat[0][0] = r1[0]
-        self.mat[0][1] = r1[1]
-        self.mat[0][2] = r1[2]
-
-        self.mat[1][0] = r2[0]
-        self.mat[1][1] = r2[1]
-        self.mat[1][2] = r2[2]
-
-        self.mat[2][0] = r3[0]
-        self.mat[2][1] = r3[1]
-        self.mat[2][2] = r3[2]
+        # I create the homogeneous rotation matrix from the rotation matrix R according to equation 5.49
+        # and I compose it with the transformation matrix mat.
+        rotation = np.identity(4)
+        rotation[:3, :3] = np.array([r1, r2, r3])
+        return self.compose(rotation)
 
     def translate(self, t):
         # t is the translation vector in non-homogeneous coordinates.
-        # I appropriately update the transformation matrix mat with the translation vector t according to equation 5.37
-        self.mat[0][3] = t[0]
-        self.mat[1][3] = t[1]
-        self.mat[2][3] = t[2]
-
-    def transform_pts(self, pts):
+        # I create the homogeneous translation matrix according to equation 5.37
+        # and I compose it with the transformation matrix mat.
+        translation = np.identity(4)
+        translation[:3, 3] = np.asarray(t).flatten()
+        return self.compose(translation)
+
+    def scale(self, s):
+        # s is the scaling factor (the same for all the axes) or a 1x3 vector with a factor for each axis.
+        scaling = np.identity(4)
+        scaling[:3, :3] = np.diag(np.broadcast_to(np.asarray(s, dtype=np.float64).flatten(), (3,)))
+        return self.compose(scaling)
+
+    def compose(self, mat):
+        # mat is a 4x4 matrix (in homogeneous coordinates) of a transform that is applied after the current one.
+        self.mat = np.asarray(mat) @ self.mat
+        return self
+
+    def then(self, other):
+        # A new Transform that applies this transform first and then the transform other.
+        return other @ self
+
+    def __matmul__(self, other):
+        # a @ b is the Transform with matrix a.mat @ b.mat, i.e., the transform b followed by the transform a.
+        result = Transform()
+        result.mat = self.mat @ other.mat
+        return result
+
+    def transform_pts(self, pts, out=None):
         # pts is a 3xN array
-        # I add 1 to each column of the pts matrix, thus changing its dimensions to 4xN.
-        # In this way, I can transform the 3D points of the pts matrix based on the mat matrix.
-
-        modified_cols = []  # Initialize an empty list to store the modified columns
-        for vector in pts.T:
-
-            # The vector is a column vector in pts array
-            # Convert the column vector to a list and append 1 to the end (making it homogeneous)
-            modified_col = vector.tolist() + [1]
-
-            # Append the modified column to the list of modified columns
-            modified_cols.append(modified_col)
-
-        # Convert the list of modified columns to a NumPy array
-        pts_transpose = np.array(modified_cols)  # pts_transpose is a Nx4 array
-        pts = pts_transpose.T
-
-        pts_transform = np.dot(self.mat, pts)  # Apply the affine transformation to the points of pts array
-        # pts_transform is a 4xN array
+        # The matrix mat has the form [[R, t], [0, 1]], where R is 3x3 and t is 3x1.
+        # So, in non-homogeneous coordinates, the transformed points are R @ pts + t.
+        # In this way, I transform all the points with a single matrix multiplication,
+        # without adding a row of 1s to pts and without copying the coordinates column by column.
 
-        rows, cols = pts_transform.shape  # Get the number of rows and columns of pts_transform
+        # The points keep their floating-point type (float32 or float64). Any other type is converted to float64.
+        dtype = pts.dtype if pts.dtype in (np.float32, np.float64) else np.float64
+        R = self.mat[:3, :3].astype(dtype)
+        t = self.mat[:3, 3:].astype(dtype)
 
-        # I want to convert the coordinates of the transformed points to non-homogeneous
-        # I initially create an empty 3xN array
-        new_pts_transform = np.empty((rows - 1, cols))
-
-        # Copy the rows of pts_transform except the last one to new_pts_transform
-        for i in range(rows - 1):
-            new_pts_transform[i] = pts_transform[i]
-
-        # Update the pts_transform with the non-homogeneous coordinates (pts_transform is now a 3xN array)
-        pts_transform = new_pts_transform
-        return pts_transform
+        # If out (a 3xN array) is given, the transformed points are written into it (out can also be pts itself).
+        pts_transform = np.matmul(R, pts.astype(dtype, copy=False), out=out)
+        pts_transform += t
+        return pts_transform  # pts_transform is a 3xN array
 
 
 """
@@ -166,6 +176,7 @@ The function perspective_project computes the perspective projections and the de
 and then returns them. 
 Essentially, I use the x and y coordinates of the input points to generate their perspective projections. 
 Additionally, the z coordinate of the input points represents their depth.
+All the points are transformed and projected together with whole-array operations.
 
 pts is the 3xN matrix of input points.
 focal represents the distance from the camera's focal point to its center.
@@ -175,61 +186,181 @@ t is the 1x3 translation vector to the camera's coordinate system.
 
 
 def perspective_project(pts, focal, R, t):
-    # Transform the input points to camera's coordinates
-    # pts_transform is a Nx3 array
-    pts_transform = world2view(pts, R, t)
+    # Transform the input points to camera's coordinates (the same transform as world2view, fused in here)
+    # pts_transform is a 3xN array (each column is a point)
+    pts_transform = R @ (pts - np.reshape(t, (3, 1)))
+    return project_view(pts_transform, focal)
 
-    # Extracting the z-coordinate (i.e., the third coordinate) to create the depths array
-    depths = []
-    for point in pts_transform:
-        depths.append(point[2])  # The z-coordinate represents the depth of the points
-    depths = np.array(depths)  # depths is a 1-D array
 
-    # Initialize lists to store the projected x and y coordinates
-    x_q = []
-    y_q = []
+"""
+The function project_view does the projection step of perspective_project for points pts_view (a 3xN array) that are
+already in the camera's coordinate system. It returns the Nx2 array of the perspective projections and the depths.
+"""
+
+
+def project_view(pts_view, focal):
+    # The z-coordinate (i.e., the third row) represents the depth of the points
+    depths = pts_view[2]  # depths is a 1-D array
 
     # Below, I apply the relationships: x_q = (w * x_p)/z_p , y_q = (w * y_p)/z_p  (page 72 of gr-notes.pdf)
+    # to all the points at once.
     # focal corresponds to w
-    # z_p corresponds to depths[i]
-    # x_p corresponds to pts_transform[i][0]
-    # y_p corresponds to pts_transform[i][1]
+    # z_p corresponds to depths
+    # x_p corresponds to pts_view[0]
+    # y_p corresponds to pts_view[1]
     # Here, I'm working with non-homogeneous coordinates instead of homogeneous ones, as on page 72
-    for i in range(len(depths)):
-        # Calculate the projected x coordinate
-        x_q.append((focal / depths[i]) * pts_transform[i][0])
-        # Calculate the projected y coordinate
-        y_q.append((focal / depths[i]) * pts_transform[i][1])
-    x_q = np.array(x_q)
-    y_q = np.array(y_q)
-
-    pts_2d = np.array([x_q, y_q])  # pts_2d is a 2xN array
+    pts_2d = (focal / depths) * pts_view[:2]  # pts_2d is a 2xN array
     # The first row of the array pts_2d represents the x-projections, while the second row represents the y-projections.
 
     # The Nx2 array pts_2d.T contains the 2D coordinates of the input points in the camera's image plane.
     return pts_2d.T, depths
 
 
+"""
+The function clip_triangles clips the triangles against the near and the far plane of the camera, before the
+perspective projection (the division by the depth).
+pts_view (3xN) are the points in the camera's coordinate system, v_clr (Nx3) their colors and t_pos_idx (Fx3) the
+triangles. near and far are the depths of the near and the far plane (0 < near < far, far can be np.inf).
+For the perspective projection of this project, the clip space test near <= w <= far of the homogeneous coordinates
+is the test near <= z <= far of the depth in the camera's coordinate system, so the clipping is done there.
+
+The triangles that are completely between the planes are kept as they are and the ones that are completely outside
+are dropped. A triangle that crosses a plane is split: the new vertices on the plane are found by linear
+interpolation of the positions and the colors along the crossing edges, and the part of the triangle inside the
+planes is triangulated (1 or 2 triangles, with the same winding as the original triangle).
+The crossing triangles of each plane are clipped together, with whole-array operations.
+The function returns the new points (3xN'), colors (N'x3) and triangles (F'x3). The new vertices are appended after
+the original ones, so the original vertices keep their indices.
+"""
+
+
+def clip_triangles(pts_view, v_clr, t_pos_idx, near, far=np.inf):
+    pts_view = np.asarray(pts_view, dtype=np.float64)
+    v_clr = np.asarray(v_clr)
+    t_pos_idx = np.asarray(t_pos_idx, dtype=np.intp).reshape(-1, 3)
+
+    # The distances of the points from the planes (positive on the inside of the planes)
+    planes = [pts_view[2] - near]
+    if np.isfinite(far):
+        planes.append(far - pts_view[2])
+
+    for plane in range(len(planes)):
+        distances = planes[plane]
+        inside = distances[t_pos_idx] >= 0  # Fx3
+        n_inside = inside.sum(axis=1)
+        if n_inside.min() == 3:
+            continue
+
+        # The triangles with 1 or 2 vertices inside the plane are clipped
+        new_faces = [t_pos_idx[n_inside == 3]]
+        new_pts = [pts_view]
+        new_clr = [v_clr]
+        n_points = pts_view.shape[1]
+        for n in (1, 2):
+            faces = t_pos_idx[n_inside == n]
+            if len(faces) == 0:
+                continue
+            # I rotate the vertices of each triangle (keeping the winding), so that the first vertex a is the single
+            # vertex inside (n = 1) or outside (n = 2) the plane. b and c are the other two vertices.
+            first = np.argmax(inside[n_inside == n] == (n == 1), axis=1)
+            faces = faces[np.arange(len(faces))[:, None], (first[:, None] + np.arange(3)) % 3]
+            a, b, c = faces[:, 0], faces[:, 1], faces[:, 2]
+
+            # The new vertices on the edges a -> b and a -> c, where the edges cross the plane
+            t_ab = distances[a] / (distances[a] - distances[b])
+            t_ac = distances[a] / (distances[a] - distances[c])
+            for t, other in ((t_ab, b), (t_ac, c)):
+                new_pts.append(pts_view[:, a] + t * (pts_view[:, other] - pts_view[:, a]))
+                new_clr.append((v_clr[a] + t[:, None] * (v_clr[other] - v_clr[a])).astype(v_clr.dtype))
+                # The distances of the new vertices from the other planes are also interpolated
+                for other_plane in range(len(planes)):
+                    values = planes[other_plane]
+                    new_value = 0 if other_plane == plane else values[a] + t * (values[other] - values[a])
+                    planes[other_plane] = np.append(values, np.broadcast_to(new_value, t.shape))
+            ab = n_points + np.arange(len(faces))
+            ac = ab + len(faces)
+            n_points += 2 * len(faces)
+
+            if n == 1:
+                # The part inside the plane is the triangle (a, ab, ac)
+                new_faces.append(np.stack((a, ab, ac), axis=1))
+            else:
+                # The part inside the plane is the quadrilateral (ab, b, c, ac), i.e. 2 triangles
+                new_faces.append(np.stack((ab, b, c), axis=1))
+                new_faces.append(np.stack((ab, c, ac), axis=1))
+
+        pts_view = np.concatenate(new_pts, axis=1)
+        v_clr = np.concatenate(new_clr, axis=0)
+        t_pos_idx = np.concatenate(new_faces, axis=0)
+
+    return pts_view, v_clr, t_pos_idx
+
+
 """
 The function rasterize maps the coordinates of input points from the camera's plane coordinate system, 
 with a plane of dimensions plane_h × plane_w, to integer positions (pixels) of an image with dimensions res_h × res_w.
-The function returns the rasterized points.
+The function returns the rasterized points as an Nx2 int32 array. The first coordinate of a rasterized point is its row (0 to res_h - 1)
+and the second is its column (0 to res_w - 1).
+Points far outside the image (e.g. a vertex close to the near plane and far to the side) are clamped to a guard band
+of ±GUARD_BAND pixels before they are converted to int32, so they cannot overflow (and wrap around to the other side).
+The guard band is so much larger than the image that the clamping does not visibly change the triangles.
 """
 
+# The largest absolute value of a rasterized coordinate (int32 values go up to 2^31 - 1)
+GUARD_BAND = 2 ** 30
+
 
 def rasterize(pts_2d, plane_w, plane_h, res_w, res_h):
-    # Initialize a zero-filled array to store the rasterized points
-    pts_rast = np.zeros_like(pts_2d)
+    # The rasterized points are stored in an Nx2 array of integers (int32)
+    pts_rast = np.empty((len(pts_2d), 2), dtype=np.int32)
     scale_x = res_w / plane_w
     scale_y = res_h / plane_h
-    for i in range(len(pts_2d)):
-        # Calculate the x-coordinate of the rasterized point
-        pts_rast[i][0] = np.around((pts_2d[i][1] + plane_w / 2) * scale_x)
-        # Calculate the y-coordinate of the rasterized point
-        pts_rast[i][1] = np.around((pts_2d[i][0] + plane_h / 2) * scale_y)
+    # Calculate the rows (i.e., the first coordinates) of the rasterized points from the y-coordinates of the plane
+    pts_rast[:, 0] = np.clip(np.around((pts_2d[:, 1] + plane_h / 2) * scale_y), -GUARD_BAND, GUARD_BAND)
+    # Calculate the columns (i.e., the second coordinates) of the rasterized points from the x-coordinates of the plane
+    pts_rast[:, 1] = np.clip(np.around((pts_2d[:, 0] + plane_w / 2) * scale_x), -GUARD_BAND, GUARD_BAND)
     return pts_rast
 
 
+"""
+The function cull_triangles finds the triangles that cannot appear in the image, so that they are not rasterized.
+pts_rast (Nx2) are the rasterized points, depths (1-D array) their depths and t_pos_idx (Fx3) the triangles.
+res_h and res_w are the height and width of the image in pixels.
+A triangle is culled (in this order) if:
+1. it is behind the camera, i.e. one of its vertices has a depth that is not positive
+   (its perspective projection is not valid),
+2. it is off-screen, i.e. all of its vertices are beyond the same side of the image,
+3. it is back-facing (only if backface is True), i.e. its vertices appear in counter-clockwise order in the
+   (x, y) coordinates of the camera's plane, or it has zero area (the front faces of the meshes are clockwise).
+All the tests are done on whole arrays.
+The function returns the boolean array keep (True for the triangles that are kept) and a dictionary with the number
+of triangles culled by each test ("behind", "offscreen" and "backfacing").
+"""
+
+
+def cull_triangles(pts_rast, depths, t_pos_idx, res_h, res_w, backface=True):
+    # The rows, columns and depths of the vertices of the triangles (Fx3 arrays)
+    rows = pts_rast[:, 0][t_pos_idx]
+    cols = pts_rast[:, 1][t_pos_idx]
+    t_depths = depths[t_pos_idx]
+
+    behind = (t_depths <= 0).any(axis=1)
+    offscreen = ((rows < 0).all(axis=1) | (rows >= res_h).all(axis=1)
+                 | (cols < 0).all(axis=1) | (cols >= res_w).all(axis=1)) & ~behind
+
+    # Twice the signed area of the triangles in pixel coordinates (rasterize maps the y-coordinate of the plane to
+    # the row, so a clockwise triangle of the plane has a positive area here)
+    rows = rows.astype(np.float64)
+    cols = cols.astype(np.float64)
+    area = ((rows[:, 1] - rows[:, 0]) * (cols[:, 2] - cols[:, 0])
+            - (rows[:, 2] - rows[:, 0]) * (cols[:, 1] - cols[:, 0]))
+    backfacing = (area <= 0) & ~behind & ~offscreen if backface else np.zeros(len(t_pos_idx), dtype=bool)
+
+    keep = ~(behind | offscreen | backfacing)
+    culled = {"behind": int(behind.sum()), "offscreen": int(offscreen.sum()), "backfacing": int(backfacing.sum())}
+    return keep, culled
+
+
 """
 The function render_object captures a 3D scene of an object from a camera. 
 It returns an array of size resh × resw × 3 (the photograph of the object).
@@ -247,46 +378,155 @@ focal represents the distance from the camera's focal point to its center.
 eye (3x1 vector) is the center of the camera with respect to the WCS.
 up (3x1 vector) is the up vector of the camera.
 target (3x1 vector) is the target point of the camera.
+near and far are the depths of the near and the far plane of the camera. The triangles are clipped against them
+(see clip_triangles) before the perspective projection, so a triangle that crosses the camera's plane is split
+instead of being projected with huge or sign-flipped coordinates.
+cull (True by default) enables the culling of the triangles (see cull_triangles) before they are rendered.
+backface (True by default) enables the culling of the back-facing triangles, which is correct for closed meshes.
+render_options are optional keyword arguments of render_img (for example zbuffer=True or backend="numpy").
+stats is an optional RenderStats object (see render_stats.py). If it is given, the wall time of the stages
+"lookat", "project" (transform to the camera's coordinates, clipping and projection), "rasterize" and "cull" and the
+numbers of culled triangles are added to it, and it is passed on to render_img for the rest of the pipeline.
+
+The data stay in NumPy arrays through the whole pipeline (lookat -> perspective_project -> rasterize -> render_img).
 """
 
 
-def render_object(v_pos, v_clr, t_pos_idx, plane_h, plane_w, res_h, res_w, focal, eye, up, target):
+def render_object(v_pos, v_clr, t_pos_idx, plane_h, plane_w, res_h, res_w, focal, eye, up, target,
+                  near=0.1, far=np.inf, cull=True, backface=True, stats=None, **render_options):
+    # The stages are timed only if stats are collected
+    stage = stats.stage if stats is not None else nullcontext
+
     # Compute the rotation matrix and translation vector
-    R, t = lookat(eye, up, target)
+    with stage("lookat"):
+        R, t = lookat(eye, up, target)
+
+    with stage("project"):
+        # Transform the 3D points to the camera's coordinates (as in perspective_project)
+        pts_view = R @ (v_pos - np.reshape(t, (3, 1)))
 
-    # Project the 3D points to 2D and calculate their depths
-    pts_2d, depths = perspective_project(v_pos, focal, R, t)
+        # Clip the triangles against the near and far planes, project the points to 2D and calculate their depths
+        pts_2d, depths, v_clr, t_pos_idx = _clip_and_project(pts_view, v_clr, t_pos_idx, focal, near, far)
 
     # Rasterize the projected points
-    pts_rast = rasterize(pts_2d, plane_w, plane_h, res_w, res_h)
-
-    # Convert data to lists
-    pts_rast_list = []
-    for row in pts_rast:
-        pts_rast_row = []
-        for point in row:
-            pts_rast_row.append(int(point))
-        pts_rast_list.append(pts_rast_row)
-
-    depths_list = []
-    for depth in depths:
-        depths_list.append(depth)
-
-    t_pos_idx_list = []
-    for row in t_pos_idx:
-        t_pos_idx_row = []
-        for value in row:
-            t_pos_idx_row.append(value)
-        t_pos_idx_list.append(t_pos_idx_row)
-
-    v_clr_list = []
-    for color in v_clr:
-        v_clr_row = []
-        for c in color:
-            v_clr_row.append(c)
-        v_clr_list.append(v_clr_row)
-
-    # Render the image
-    image_array = render_img(t_pos_idx_list, pts_rast_list, v_clr_list, depths_list, "g")
+    with stage("rasterize"):
+        pts_rast = rasterize(pts_2d, plane_w, plane_h, res_w, res_h)
+
+    # Drop the triangles that cannot appear in the image
+    if cull:
+        with stage("cull"):
+            keep, culled = cull_triangles(pts_rast, depths, t_pos_idx, res_h, res_w, backface)
+            t_pos_idx = t_pos_idx[keep]
+        if stats is not None:
+            stats.add_culled(culled)
+
+    # Render the image. All the data are handed to render_img as contiguous typed arrays
+    # (int32 pixel coordinates, float64 depths, integer indices and the colors as given), without any conversion
+    # to Python lists.
+    image_array = render_img(t_pos_idx, pts_rast, v_clr, depths, "g", res_h, res_w, stats=stats, **render_options)
 
     return image_array  # Return the rendered image
+
+
+def _clip_and_project(pts_view, v_clr, t_pos_idx, focal, near, far):
+    v_clr = np.ascontiguousarray(v_clr)
+    t_pos_idx = np.ascontiguousarray(t_pos_idx, dtype=np.intp)
+    if (pts_view[2] < near).any() or (pts_view[2] > far).any():
+        pts_view, v_clr, t_pos_idx = clip_triangles(pts_view, v_clr, t_pos_idx, near, far)
+        # The points in front of the near plane are not used by any triangle anymore.
+        # I move them to the near plane, so that their projection is still finite.
+        pts_view[2] = np.maximum(pts_view[2], near)
+    pts_2d, depths = project_view(pts_view, focal)
+    return pts_2d, depths, v_clr, t_pos_idx
+
+
+"""
+The function render_animation renders a sequence of frames of the same object (for example a turntable) as a batch.
+It is a generator that yields the frames (res_h × res_w × 3 arrays) one by one, in order.
+
+v_pos, v_clr, t_pos_idx, plane_h, plane_w, res_h, res_w and focal are the same as in render_object.
+transforms is a sequence with one affine transform for each frame (a Transform object or a 4x4 matrix),
+which is applied to the original vertices v_pos.
+eyes, ups and targets are the camera poses of the frames: each of them is either a sequence with one 3x1 vector for
+each frame, or a single 3x1 vector that is used for all the frames.
+batch_size is the number of frames whose vertices are transformed and projected together.
+near, far, cull and backface are the clipping planes and the culling settings of each frame (as in render_object).
+render_options are optional keyword arguments of render_img (as in render_object).
+stats is an optional RenderStats object (as in render_object), which collects the times and the counters of all the
+frames (the stages "transform", "project" and "rasterize" are measured for the whole batches of frames).
+
+The preprocessing of the mesh (the index and color arrays) is done once for all the frames.
+The vertices of batch_size frames are transformed with a single stacked matrix multiplication
+(a batch_size × 3 × 3 array of rotations with the 3xN array v_pos) and projected together.
+"""
+
+
+def render_animation(v_pos, v_clr, t_pos_idx, plane_h, plane_w, res_h, res_w, focal, transforms, eyes, ups, targets,
+                     batch_size=16, near=0.1, far=np.inf, cull=True, backface=True, stats=None,
+                     **render_options):
+    stage = stats.stage if stats is not None else nullcontext
+
+    # The mesh data that are shared by all the frames
+    v_pos = np.asarray(v_pos, dtype=np.float64)
+    v_clr = np.ascontiguousarray(v_clr)
+    t_pos_idx = np.ascontiguousarray(t_pos_idx, dtype=np.intp)
+
+    # The 4x4 matrices of the transforms (F x 4 x 4, F is the number of frames)
+    mats = np.array([transform.mat if isinstance(transform, Transform) else transform for transform in transforms],
+                    dtype=np.float64).reshape(-1, 4, 4)
+    n_frames = len(mats)
+
+    # The camera poses as F x 3 arrays
+    eyes, ups, targets = (_per_frame_vectors(vectors, n_frames) for vectors in (eyes, ups, targets))
+
+    for start in range(0, n_frames, batch_size):
+        end = min(start + batch_size, n_frames)
+
+        # Transform the vertices of all the frames of the batch at once (B x 3 x N, B is the number of frames)
+        with stage("transform"):
+            pts = mats[start:end, :3, :3] @ v_pos + mats[start:end, :3, 3:]
+
+        with stage("lookat"):
+            # Compute the rotation matrices and translation vectors of the cameras (B x 3 x 3 and B x 3 x 1)
+            cameras = [lookat(eyes[i].reshape(3, 1), ups[i].reshape(3, 1), targets[i].reshape(3, 1))
+                       for i in range(start, end)]
+            R = np.array([camera[0] for camera in cameras])
+            t = np.array([camera[1] for camera in cameras]).reshape(-1, 3, 1)
+
+        # Project the points of all the frames of the batch (as in perspective_project)
+        # The frames with points outside the near and far planes are clipped and projected again below,
+        # so their invalid projections here are ignored.
+        with stage("project"), np.errstate(divide="ignore", invalid="ignore"):
+            pts_transform = R @ (pts - t)
+            depths = pts_transform[:, 2]  # B x N
+            pts_2d = (focal / depths[:, None]) * pts_transform[:, :2]  # B x 2 x N
+
+        # Rasterize the projected points of all the frames of the batch (B x N x 2)
+        with stage("rasterize"), np.errstate(divide="ignore", invalid="ignore"):
+            pts_rast = rasterize(pts_2d.transpose(0, 2, 1).reshape(-1, 2), plane_w, plane_h, res_w, res_h)
+        pts_rast = pts_rast.reshape(end - start, -1, 2)
+
+        for i in range(end - start):
+            frame_rast, frame_depths, frame_clr, faces = pts_rast[i], depths[i], v_clr, t_pos_idx
+            if (frame_depths < near).any() or (frame_depths > far).any():
+                with stage("project"):
+                    frame_2d, frame_depths, frame_clr, faces = _clip_and_project(pts_transform[i], v_clr, t_pos_idx,
+                                                                                 focal, near, far)
+                with stage("rasterize"):
+                    frame_rast = rasterize(frame_2d, plane_w, plane_h, res_w, res_h)
+            if cull:
+                with stage("cull"):
+                    keep, culled = cull_triangles(frame_rast, frame_depths, faces, res_h, res_w, backface)
+                    faces = faces[keep]
+                if stats is not None:
+                    stats.add_culled(culled)
+            yield render_img(faces, frame_rast, frame_clr, frame_depths, "g", res_h, res_w, stats=stats,
+                             **render_options)
+
+
+def _per_frame_vectors(vectors, n_frames):
+    # A single 3x1 (or 1x3) vector is used for all the frames. Otherwise, there is one vector for each frame.
+    vectors = np.asarray(vectors, dtype=np.float64)
+    if vectors.size == 3:
+        return np.tile(vectors.reshape(1, 3), (n_frames, 1))
+    return vectors.reshape(n_frames, 3)
@@ -0,0 +1,210 @@
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+import numpy as np
+from frame_writer import encode_png, decode_png, to_uint8
+from backends import BACKENDS
+from functions import Transform, render_object, render_animation
+from incremental import RenderState
+from render_img import render_img
+from scenes import triangle_soup, full_frame, hw1_scene, hw2_scene
+
+"""
+The golden-image regression harness of the rendering paths.
+
+Every case renders a scene through the reference backend (f_shading / g_shading, one call per triangle, with a depth
+buffer) and through every other registered backend (see backends.py) and incremental rendering, and the
+images of each backend are compared with the reference images: the maximum and the mean per-pixel difference,
+the number of pixels that differ by more than tolerance in some channel and the PSNR (in dB, inf for equal images).
+A backend passes a case if at most max_pixels (a fraction of the pixels) differ by more than tolerance and the
+PSNR is at least min_psnr. The default limit of max_pixels (0.0001, i.e. 26 pixels of a 512 × 512 image) allows the
+few pixels where two triangles have exactly the same depth and the backends pick a different one of them (at most
+15 pixels in these cases), so an error smaller than that (e.g. a few pixels of a missing edge of a small triangle)
+is not detected, but a missing or misplaced triangle or edge of more than 26 pixels (that differ by more than
+tolerance from the reference) is.
+
+The cases are the bundled scenes, hw1.npy (flat and Gouraud shading) and hw2.npy (the object, and the 4 steps of
+demo.py, where the reference renders every step with render_object and the backends with render_animation),
+and a random soup of tiny triangles (see scenes.py).
+
+The memory of the candidates that rasterize in this process (MEMORY_CANDIDATES) is also checked, on 2 triangles that
+cover a whole 4K frame (see full_frame in scenes.py): the peak of the memory allocated during the render (traced with
+tracemalloc) must be at most the frame buffers of render_img (the image, a copy of it and the depth buffer) plus
+memory_budget MB, so a backend that rasterizes the bounding box of a large triangle at once fails the check.
+
+The reference images can also be saved as golden images (a NumPy file and a PNG image for every image) with --save,
+and compared with the golden images of an earlier commit with --golden, so that the reference path itself is
+checked too. In both cases, every PNG image is also checked: it must decode (with decode_png) to its NumPy file.
+The PNG images in the results directories of the projects are not used as golden images: they were rendered by the
+first version of the renderer (before the top-left fill rule) and some of them are JPEG images.
+
+Usage (from this directory):
+python golden.py                      compares every backend with the reference
+python golden.py --save golden        also saves the reference images in the directory golden
+python golden.py --golden golden      also compares the reference images with the ones saved in golden
+python golden.py --output report.json saves the report as JSON
+The script exits with status 1 if any comparison (or memory check) fails.
+"""
+
+# The candidates that are compared, by name, with a function that returns their render options (of render_img): the
+# registered backends (BACKENDS of backends.py) and the incremental rendering. Each candidate gets new options for
+# every case, so that the incremental rendering starts every case with an empty RenderState.
+CANDIDATES = {"reference": lambda: {"backend": "reference", "zbuffer": True}}
+for _name in BACKENDS:
+    if _name != "reference":
+        CANDIDATES[_name] = lambda name=_name: {"backend": name}
+CANDIDATES["incremental"] = lambda: {"state": RenderState()}
+
+# The candidates whose memory is checked. The workers of the tiled backend use shared memory, which is not traced, and
+# each of them only rasterizes tiles of 64 × 64 pixels.
+MEMORY_CANDIDATES = ("reference", "numpy", "incremental")
+
+
+def psnr(reference, image):
+    # The peak signal-to-noise ratio of image with respect to reference (both with values from 0 to 1).
+    mse = np.mean((np.asarray(reference, dtype=np.float64) - np.asarray(image, dtype=np.float64)) ** 2)
+    return np.inf if mse == 0 else 10 * np.log10(1 / mse)
+
+
+def compare_images(reference, image, tolerance=1 / 255, max_pixels=0.0001, min_psnr=40.0):
+    reference = np.asarray(reference, dtype=np.float64)
+    image = np.asarray(image, dtype=np.float64)
+    if reference.shape != image.shape:
+        return {"shape": [list(reference.shape), list(image.shape)], "passed": False}
+    diff = np.abs(reference - image).max(axis=-1)  # The largest difference of the channels of every pixel
+    pixels_over = int(np.count_nonzero(diff > tolerance))
+    value = psnr(reference, image)
+    return {"max_diff": float(diff.max()), "mean_diff": float(diff.mean()), "pixels_over": pixels_over,
+            "fraction_over": pixels_over / diff.size, "psnr": value,
+            "passed": bool(pixels_over <= max_pixels * diff.size and value >= min_psnr)}
+
+
+def cases():
+    # Every case is a function that renders its images with the render options of a backend.
+    # reference is True for the reference backend.
+    hw1 = hw1_scene()
+    hw2 = hw2_scene()
+    mesh = (hw2["v_pos"], hw2["v_clr"], hw2["t_pos_idx"])
+    camera = tuple(hw2[name] for name in ("plane_h", "plane_w", "res_h", "res_w", "focal"))
+    pose = (hw2["eye"], hw2["up"], hw2["target"])
+    soup = triangle_soup(20000)
+
+    # The transforms of the 4 steps of demo.py
+    transforms = [Transform(), Transform().rotate(hw2["theta_0"], hw2["rot_axis_0"])]
+    transforms.append(transforms[-1].then(Transform().translate(hw2["t_0"])))
+    transforms.append(transforms[-1].then(Transform().translate(hw2["t_1"])))
+
+    def hw2_steps(options, reference):
+        if reference:
+            return [render_object(transform.transform_pts(mesh[0]), *mesh[1:], *camera, *pose, **options)
+                    for transform in transforms]
+        return list(render_animation(*mesh, *camera, transforms, *pose, **options))
+
+    return {
+        "hw1-f": lambda options, reference: [render_img(*hw1, "f", **options)],
+        "hw1-g": lambda options, reference: [render_img(*hw1, "g", **options)],
+        "hw2": lambda options, reference: [render_object(*mesh, *camera, *pose, **options)],
+        "hw2-steps": hw2_steps,
+        "soup-tiny": lambda options, reference: [render_img(*soup, "g", **options)],
+    }
+
+
+def memory_check(candidate, res_h=2160, res_w=3840, memory_budget=64):
+    # The peak memory (in MB) of a render of full_frame with a candidate, and its limit.
+    scene = full_frame(res_h, res_w)
+    options = CANDIDATES[candidate]()
+    tracemalloc.start()
+    try:
+        render_img(*scene, "g", res_h, res_w, **options)
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+    limit = res_h * res_w * (2 * 3 * 4 + 8) / 2 ** 20 + memory_budget  # 2 float32 images and a float64 depth buffer
+    passed = peak <= limit
+    print("{:10s} {:12s} {:4s}  peak memory {:.0f} MB (limit {:.0f} MB)".format(
+        "full-4k", candidate, "ok" if passed else "FAIL", peak, limit))
+    return {"case": "full-4k", "backend": candidate, "passed": passed, "peak_mb": peak, "limit_mb": limit}
+
+
+def run(candidates=None, golden=None, save=None, memory_budget=64, **limits):
+    candidates = candidates or [name for name in CANDIDATES if name != "reference"]
+    report = []
+    for case, render in cases().items():
+        references = render(CANDIDATES["reference"](), True)
+        if save:
+            _save_golden(save, case, references)
+            report.append(_check_png(save, case, len(references)))
+        if golden:
+            saved = [np.load(os.path.join(golden, "{}-{}.npy".format(case, i))) for i in range(len(references))]
+            report.append(_check_png(golden, case, len(references)))
+            report.append(_compare(case, "golden", saved, references, limits))
+        for candidate in candidates:
+            report.append(_compare(case, candidate, references, render(CANDIDATES[candidate](), False), limits))
+    for candidate in MEMORY_CANDIDATES:
+        if candidate == "reference" or candidate in candidates:
+            report.append(memory_check(candidate, memory_budget=memory_budget))
+    return report
+
+
+def _compare(case, candidate, references, images, limits):
+    results = [compare_images(reference, image, **limits) for reference, image in zip(references, images)]
+    passed = len(images) == len(references) and all(result["passed"] for result in results)
+    entry = {"case": case, "backend": candidate, "passed": passed, "images": results}
+    worst = min(results, key=lambda result: result.get("psnr", -np.inf))
+    print("{:10s} {:12s} {:4s}  max diff {:.4f}  pixels over {:6d}  PSNR {:6.2f} dB".format(
+        case, candidate, "ok" if passed else "FAIL", worst.get("max_diff", np.nan), worst.get("pixels_over", -1),
+        worst.get("psnr", np.nan)))
+    return entry
+
+
+def _save_golden(directory, case, images):
+    os.makedirs(directory, exist_ok=True)
+    for i, image in enumerate(images):
+        path = os.path.join(directory, "{}-{}".format(case, i))
+        np.save(path + ".npy", image)
+        with open(path + ".png", "wb") as file:
+            file.write(encode_png(to_uint8(image)))
+
+
+def _check_png(directory, case, count):
+    # Every saved PNG image must decode to its NumPy file (converted to 8 bits, as it was encoded).
+    passed = True
+    for i in range(count):
+        path = os.path.join(directory, "{}-{}".format(case, i))
+        with open(path + ".png", "rb") as file:
+            passed &= np.array_equal(decode_png(file.read()), to_uint8(np.load(path + ".npy")))
+    print("{:10s} {:12s} {:4s}  the PNG images decode to the NumPy files".format(
+        case, "png", "ok" if passed else "FAIL"))
+    return {"case": case, "backend": "png", "passed": bool(passed)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the accelerated rendering backends with the reference.")
+    parser.add_argument("--candidates", "--backends", nargs="+",
+                        choices=[name for name in CANDIDATES if name != "reference"],
+                        help="the backends (or incremental) to compare (by default, all of them)")
+    parser.add_argument("--tolerance", type=float, default=1 / 255, help="the largest allowed per-pixel difference")
+    parser.add_argument("--max-pixels", type=float, default=0.0001,
+                        help="the largest allowed fraction of pixels over the tolerance")
+    parser.add_argument("--min-psnr", type=float, default=40.0, help="the smallest allowed PSNR (dB)")
+    parser.add_argument("--memory-budget", type=float, default=64,
+                        help="the largest allowed memory (MB) of a 4K render, besides the frame buffers")
+    parser.add_argument("--save", help="save the reference images as golden images in this directory")
+    parser.add_argument("--golden", help="compare the reference images with the golden images of this directory")
+    parser.add_argument("--output", help="save the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = run(args.candidates, args.golden, args.save, args.memory_budget,
+                 tolerance=args.tolerance, max_pixels=args.max_pixels, min_psnr=args.min_psnr)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    failed = [entry for entry in report if not entry["passed"]]
+    print("{} of {} comparisons passed".format(len(report) - len(failed), len(report)))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,138 @@
+import numpy as np
+from barycentric import pixel_boxes
+from batch_shading import batch_shading
+
+"""
+The class RenderState keeps the image (framebuffer) and the depth buffer of the previous render, so that the next
+render of a scene that changed only in part does not have to color every triangle again (incremental rendering).
+It is given to render_img with the argument state and render_img then calls its render function.
+
+The render function takes the triangles of the new scene: vertices is a K × 3 × 2 array with the 2D coordinates of
+their vertices, vcolors is a K × 3 × 3 array with their colors and depths is a K × 3 array with their depths
+(as in batch_shading), shading is "f" or "g" and res_h, res_w are the height and width of the image.
+It returns a copy of the new image, so the returned images are not changed by the next renders.
+stats (optional) is a RenderStats object (see render_stats.py), whose counters of pixels and triangles are updated
+with the triangles that are colored again.
+
+The triangles of the new scene are compared with the triangles of the previous one (as a set, so their order and
+their number may change, e.g. when other triangles are culled). A triangle that was removed or changed makes its
+old bounding box dirty and a triangle that was added or changed makes its new bounding box dirty.
+The dirty pixels are tracked in tiles of tile_size × tile_size pixels and consecutive dirty tiles of a row of tiles
+are merged into dirty rectangles. Each dirty rectangle is cleared and only the triangles that overlap it are
+colored again, with batch_shading on the part of the image and of the depth buffer inside the rectangle.
+The pixels outside the dirty rectangles are not touched.
+The first render, a render with a different shading or image size, and a render where more than max_dirty of the
+image is dirty, color the whole image again. As with the numpy backend, visibility is resolved with the depth buffer.
+The counters full_renders and partial_renders count the renders of each kind and dirty_pixels is the number of
+pixels of the dirty rectangles of the last render.
+"""
+
+
+class RenderState:
+    def __init__(self, tile_size=32, max_dirty=0.5):
+        self.tile_size = tile_size
+        self.max_dirty = max_dirty
+        self.img = None
+        self.zbuf = None
+        self.full_renders = 0
+        self.partial_renders = 0
+        self.dirty_pixels = 0
+        self._shading = None
+        self._triangles = None  # The previous triangles, as K × 18 rows (vertices, colors, depths).
+
+    def render(self, vertices, vcolors, depths, shading, res_h=512, res_w=512, stats=None):
+        vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3, 2)
+        vcolors = np.asarray(vcolors, dtype=np.float64).reshape(-1, 3, 3)
+        depths = np.asarray(depths, dtype=np.float64).reshape(-1, 3)
+        triangles = np.concatenate((vertices.reshape(-1, 6), vcolors.reshape(-1, 9), depths), axis=1)
+
+        if self.img is None or self.img.shape[:2] != (res_h, res_w) or shading != self._shading:
+            self._render_full(vertices, vcolors, depths, shading, res_h, res_w, stats)
+        else:
+            removed, added = self._compare(triangles)
+            old = self._triangles[removed, :6].reshape(-1, 3, 2)
+            dirty = self._dirty_tiles(np.concatenate((old, vertices[added])))
+            rects = self._dirty_rects(dirty)
+            self.dirty_pixels = sum((x1 - x0) * (y1 - y0) for x0, x1, y0, y1 in rects)
+            if self.dirty_pixels > self.max_dirty * res_h * res_w:
+                self._render_full(vertices, vcolors, depths, shading, res_h, res_w, stats)
+            else:
+                self._render_rects(rects, vertices, vcolors, depths, shading, stats)
+                self.partial_renders += 1
+
+        self._shading = shading
+        self._triangles = triangles
+        return self.img.copy()
+
+    def _render_full(self, vertices, vcolors, depths, shading, res_h, res_w, stats):
+        # The background of the canvas is white and the depth buffer is empty.
+        self.img = np.ones((res_h, res_w, 3), dtype=np.float32)
+        self.zbuf = np.full((res_h, res_w), np.inf)
+        shaded_before = stats.pixels_shaded if stats is not None else 0
+        batch_shading(self.img, self.zbuf, vertices, vcolors, depths, shading, stats)
+        if stats is not None:
+            stats.add_overdraw(shaded_before, np.isfinite(self.zbuf))
+        self.full_renders += 1
+        self.dirty_pixels = res_h * res_w
+
+    def _compare(self, triangles):
+        # I give the same id to equal triangles (rows) of the previous and the new scene.
+        old = self._triangles
+        rows = np.ascontiguousarray(np.concatenate((old, triangles)))
+        _, ids = np.unique(rows.view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1]))).ravel(),
+                           return_inverse=True)
+        ids = ids.ravel()
+        old_ids, new_ids = ids[:len(old)], ids[len(old):]
+        # The triangles that are only in the previous scene were removed and the ones only in the new one were added.
+        return ~np.isin(old_ids, new_ids), ~np.isin(new_ids, old_ids)
+
+    def _dirty_tiles(self, vertices):
+        M, N = self.img.shape[:2]
+        t = self.tile_size
+        tiles_h, tiles_w = -(-M // t), -(-N // t)
+        x_min, x_max, y_min, y_max = pixel_boxes(vertices, M, N)
+        keep = (x_min <= x_max) & (y_min <= y_max)
+
+        # I mark the range of tiles of every bounding box in a difference array, so that the cumulative sums along
+        # both axes are positive exactly on the dirty tiles.
+        diff = np.zeros((tiles_h + 1, tiles_w + 1), dtype=np.intp)
+        tx0, tx1 = x_min[keep] // t, x_max[keep] // t + 1
+        ty0, ty1 = y_min[keep] // t, y_max[keep] // t + 1
+        np.add.at(diff, (tx0, ty0), 1)
+        np.add.at(diff, (tx0, ty1), -1)
+        np.add.at(diff, (tx1, ty0), -1)
+        np.add.at(diff, (tx1, ty1), 1)
+        return np.cumsum(np.cumsum(diff, axis=0), axis=1)[:tiles_h, :tiles_w] > 0
+
+    def _dirty_rects(self, dirty):
+        # Every run of consecutive dirty tiles in a row of tiles becomes a rectangle (x0, x1, y0, y1) of pixels.
+        M, N = self.img.shape[:2]
+        t = self.tile_size
+        rects = []
+        for i, row in enumerate(dirty):
+            edges = np.diff(np.concatenate(([0], row.astype(np.int8), [0])))
+            for j0, j1 in zip(np.nonzero(edges == 1)[0], np.nonzero(edges == -1)[0]):
+                rects.append((i * t, min((i + 1) * t, M), j0 * t, min(j1 * t, N)))
+        return rects
+
+    def _render_rects(self, rects, vertices, vcolors, depths, shading, stats):
+        M, N = self.img.shape[:2]
+        x_min, x_max, y_min, y_max = pixel_boxes(vertices, M, N)
+        drawn = np.zeros(len(vertices), dtype=bool)  # A triangle may color many rectangles, but it is counted once.
+        for x0, x1, y0, y1 in rects:
+            # I clear the rectangle and color again the triangles that overlap it, in the coordinates of the
+            # rectangle (as the tiles of tiled_shading).
+            self.img[x0:x1, y0:y1] = 1
+            self.zbuf[x0:x1, y0:y1] = np.inf
+            idx = np.nonzero((x_min < x1) & (x_max >= x0) & (y_min < y1) & (y_max >= y0))[0]
+            if len(idx):
+                shaded_before = stats.pixels_shaded if stats is not None else 0
+                rect_drawn = np.zeros(len(idx), dtype=bool)
+                batch_shading(self.img[x0:x1, y0:y1], self.zbuf[x0:x1, y0:y1],
+                              vertices[idx] - np.array([x0, y0]), vcolors[idx], depths[idx], shading, stats,
+                              rect_drawn)
+                drawn[idx[rect_drawn]] = True
+                if stats is not None:
+                    stats.add_overdraw(shaded_before, np.isfinite(self.zbuf[x0:x1, y0:y1]))
+        if stats is not None:
+            stats.drawn += int(np.count_nonzero(drawn))
@@ -0,0 +1,96 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from functions import Transform, render_object, _per_frame_vectors
+from render_stats import RenderStats
+
+"""
+The function render_frames_parallel renders the frames of an animation in parallel, in worker processes.
+It has the same input arguments as render_animation (in functions.py) and it is also a generator that yields the
+frames in order. workers is the number of processes (by default, one for each CPU).
+batch_size is accepted for compatibility with render_animation and ignored: every frame is a task of its own.
+If stats (a RenderStats object) is given, every frame is measured in a RenderStats object of its own in the worker,
+which is sent back with the frame and merged into stats (so its times are the sums of the times of the workers).
+
+Every frame is rendered by render_object in a worker of a ProcessPoolExecutor.
+The mesh (v_pos, v_clr, t_pos_idx) is placed in shared memory (multiprocessing.shared_memory) once, and the workers
+attach to it when they start, so the tasks only carry the transform and the camera pose of a frame.
+At most max_pending frames (by default, twice the number of workers) are rendered ahead of the frame that is
+yielded next, so the finished frames are streamed back in order and the memory stays bounded.
+"""
+
+
+def render_frames_parallel(v_pos, v_clr, t_pos_idx, plane_h, plane_w, res_h, res_w, focal, transforms, eyes, ups,
+                           targets, workers=None, max_pending=None, batch_size=None, stats=None, **render_options):
+    mesh = {"v_pos": np.ascontiguousarray(v_pos, dtype=np.float64),
+            "v_clr": np.ascontiguousarray(v_clr),
+            "t_pos_idx": np.ascontiguousarray(t_pos_idx, dtype=np.intp)}
+
+    mats = np.array([transform.mat if isinstance(transform, Transform) else transform for transform in transforms],
+                    dtype=np.float64).reshape(-1, 4, 4)
+    n_frames = len(mats)
+    eyes, ups, targets = (_per_frame_vectors(vectors, n_frames) for vectors in (eyes, ups, targets))
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    camera = (plane_h, plane_w, res_h, res_w, focal)
+
+    blocks = {}
+    try:
+        # I copy the mesh into shared memory blocks. The workers attach to them by name.
+        for name, array in mesh.items():
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            blocks[name] = block
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        specs = {name: (blocks[name].name, array.shape, array.dtype.str) for name, array in mesh.items()}
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(specs, camera, render_options)) as executor:
+            pending = deque()
+            for i in range(n_frames):
+                pending.append(executor.submit(_render_frame, mats[i], eyes[i], ups[i], targets[i],
+                                               stats is not None))
+                if len(pending) >= max_pending:
+                    yield _frame_result(pending.popleft(), stats)
+            while pending:
+                yield _frame_result(pending.popleft(), stats)
+    finally:
+        for block in blocks.values():
+            block.close()
+            block.unlink()
+
+
+# The shared memory blocks, the mesh arrays and the rendering settings of a worker process (set by _init_worker).
+_worker_blocks = []
+_worker_mesh = {}
+_worker_settings = {}
+
+
+def _init_worker(specs, camera, render_options):
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _worker_blocks.append(block)
+        _worker_mesh[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    _worker_settings["camera"] = camera
+    _worker_settings["render_options"] = render_options
+
+
+def _frame_result(future, stats):
+    # The frame of a finished task. Its stats (if they were collected) are merged into stats.
+    img, frame_stats = future.result()
+    if stats is not None:
+        stats.merge(frame_stats)
+    return img
+
+
+def _render_frame(mat, eye, up, target, collect_stats):
+    # Transform the vertices of the mesh and render the frame
+    v_pos = mat[:3, :3] @ _worker_mesh["v_pos"] + mat[:3, 3:]
+    plane_h, plane_w, res_h, res_w, focal = _worker_settings["camera"]
+    stats = RenderStats() if collect_stats else None
+    img = render_object(v_pos, _worker_mesh["v_clr"], _worker_mesh["t_pos_idx"], plane_h, plane_w, res_h, res_w,
+                        focal, eye.reshape(3, 1), up.reshape(3, 1), target.reshape(3, 1), stats=stats,
+                        **_worker_settings["render_options"])
+    return img, stats
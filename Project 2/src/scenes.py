@@ -0,0 +1,109 @@
+import os
+import numpy as np
+from functions import lookat, perspective_project, rasterize
+from mesh_io import load_mesh
+
+"""
+Scene generators for the benchmarks (see benchmark.py).
+All of them are reproducible: the random scenes are generated from a seed.
+
+The function triangle_soup generates n random triangles in the format of the input arguments of render_img:
+it returns (faces, vertices, vcolors, depth), with K × 3 faces, L × 2 vertices in pixel coordinates,
+L × 3 colors and L depths (every triangle has its own 3 vertices).
+The triangles are spread over an image of res_h × res_w pixels and the size of each triangle (the length of its
+sides, in pixels) is drawn from a log-uniform distribution between min_size and max_size, so that the distribution
+of the sizes can be controlled: e.g. min_size=0.5, max_size=4 gives the tiny triangles of dense meshes and
+min_size=20, max_size=200 gives large ones. A part of the triangles (partly_outside) is placed partly outside the image.
+
+The function sphere generates a tessellated (UV) sphere of about n_faces triangles in the format of the input
+arguments of render_object: it returns (v_pos, v_clr, t_pos_idx), with 3 × N points, N × 3 colors and F × 3
+triangles. The triangles are clockwise when they are seen from outside (the front faces of the meshes of Project 2).
+The colors of the vertices are given by their normal vectors.
+
+The function camera returns the camera arguments of render_object (plane_h, plane_w, res_h, res_w, focal, eye, up,
+target), with the camera of hw2.npy and an image of res_h × res_w pixels: a sphere of radius 2 fills about half of
+the image.
+
+The function project_scene projects a 3D mesh with a camera (as render_object) and returns it in the format of the
+input arguments of render_img (faces, vertices, vcolors, depth), so the 2D stages can be measured alone.
+
+The function full_frame returns 2 triangles (in the format of the input arguments of render_img) that together cover
+the whole image of res_h × res_w pixels (by default, a 4K frame), i.e. the largest triangles a scene can have.
+
+The functions hw1_scene and hw2_scene load the bundled scenes (hw1.npy of Project 1 and hw2.npy of Project 2):
+hw1_scene returns (faces, vertices, vcolors, depth) and hw2_scene returns the dictionary of load_mesh.
+"""
+
+_SRC = os.path.dirname(os.path.abspath(__file__))
+
+
+def triangle_soup(n, res_h=512, res_w=512, min_size=0.5, max_size=4.0, partly_outside=0.05, seed=0):
+    rng = np.random.default_rng(seed)
+    size = np.exp(rng.uniform(np.log(min_size), np.log(max_size), n))
+
+    # The centers of the triangles, inside the image (or, for partly_outside of them, near its borders).
+    centers = rng.uniform((0, 0), (res_h, res_w), (n, 2))
+    outside = rng.random(n) < partly_outside
+    centers[outside] = np.where(rng.random((outside.sum(), 2)) < 0.5, 0, (res_h, res_w))
+
+    # The vertices are at random angles around the center, at a distance of about size / 2.
+    angles = rng.uniform(0, 2 * np.pi, (n, 3))
+    radius = size[:, None] / 2 * rng.uniform(0.5, 1, (n, 3))
+    vertices = centers[:, None, :] + radius[:, :, None] * np.stack((np.cos(angles), np.sin(angles)), axis=-1)
+
+    faces = np.arange(3 * n).reshape(n, 3)
+    vcolors = rng.random((3 * n, 3))
+    depth = rng.uniform(1, 10, 3 * n)
+    return faces, vertices.reshape(-1, 2), vcolors, depth
+
+
+def sphere(n_faces, radius=2.0):
+    # A sphere with s stacks and 2s slices has 4 s^2 triangles (2 for every quad of the grid of the angles).
+    stacks = max(int(round(np.sqrt(n_faces / 4))), 2)
+    slices = 2 * stacks
+    theta = np.linspace(0, np.pi, stacks + 1)  # From the north to the south pole
+    phi = np.linspace(0, 2 * np.pi, slices + 1)
+    theta, phi = np.meshgrid(theta, phi, indexing="ij")
+
+    normals = np.stack((np.sin(theta) * np.cos(phi), np.cos(theta), np.sin(theta) * np.sin(phi))).reshape(3, -1)
+    v_pos = radius * normals
+    v_clr = (normals.T + 1) / 2
+
+    # The 4 corners of every quad of the grid, split into 2 triangles.
+    i, j = np.meshgrid(np.arange(stacks), np.arange(slices), indexing="ij")
+    a = (i * (slices + 1) + j).ravel()
+    b, c, d = a + 1, a + slices + 1, a + slices + 2
+    t_pos_idx = np.concatenate((np.stack((a, b, c), axis=1), np.stack((b, d, c), axis=1)))
+    return v_pos, v_clr, t_pos_idx
+
+
+def camera(res_h=512, res_w=512):
+    eye = np.array([[0.0], [0.0], [-35.0]])
+    up = np.array([[0.0], [1.0], [0.0]])
+    target = np.zeros((3, 1))
+    return 15, 15, res_h, res_w, 70, eye, up, target
+
+
+def project_scene(v_pos, v_clr, t_pos_idx, plane_h, plane_w, res_h, res_w, focal, eye, up, target):
+    R, t = lookat(eye, up, target)
+    pts_2d, depths = perspective_project(v_pos, focal, R, t)
+    pts_rast = rasterize(pts_2d, plane_w, plane_h, res_w, res_h)
+    return t_pos_idx, pts_rast, v_clr, depths
+
+
+def full_frame(res_h=2160, res_w=3840, seed=0):
+    # The 2 halves of a rectangle a little larger than the image, with random colors and depths.
+    rng = np.random.default_rng(seed)
+    x0, x1, y0, y1 = -10, res_h + 10, -10, res_w + 10
+    vertices = np.array([[x0, y0], [x1, y0], [x0, y1], [x1, y1], [x0, y1], [x1, y0]], dtype=np.float64)
+    faces = np.arange(6).reshape(2, 3)
+    return faces, vertices, rng.random((6, 3)), rng.uniform(1, 10, 6)
+
+
+def hw1_scene():
+    data = load_mesh(os.path.join(_SRC, "..", "..", "Project 1", "src", "hw1.npy"))
+    return data["faces"], data["vertices"], data["vcolors"], data["depth"]
+
+
+def hw2_scene():
+    return load_mesh(os.path.join(_SRC, "hw2.npy"))